@@ -8,8 +8,9 @@ A股交易约束模块
 """
 
 import math
+import numpy as np
 import pandas as pd
-from typing import Dict, Optional, Tuple
+from typing import Dict, Optional, Tuple, Union
 from loguru import logger
 
 
@@ -22,46 +23,59 @@ class TPlusOneTracker:
 
     def __init__(self):
         """初始化T+1跟踪器"""
-        self.buy_dates: Dict[str, pd.Timestamp] = {}  # {symbol: buy_date}
+        # 内部按公历序数(int)存储买入日, can_sell只做整数比较
+        self.buy_dates: Dict[str, int] = {}  # {symbol: buy_date_ordinal}
 
-    def can_sell(self, symbol: str, current_date: pd.Timestamp, position_size: float) -> bool:
+    @staticmethod
+    def _to_ordinal(date) -> int:
+        """日期转换为公历序数, 已是整数时直接返回"""
+        if isinstance(date, (int, np.integer)):
+            return int(date)
+        return date.toordinal()
+
+    def can_sell(self, symbol: str, current_date: Union[pd.Timestamp, int], position_size: float) -> bool:
         """
         检查股票是否可以卖出
 
         Args:
             symbol: 股票代码
-            current_date: 当前日期
+            current_date: 当前日期(Timestamp或公历序数)
             position_size: 持仓数量
 
         Returns:
             bool: True可以卖出, False不能卖出
         """
         # 如果没有买入记录,说明是历史持仓,可以卖出
-        if symbol not in self.buy_dates:
+        buy_date = self.buy_dates.get(symbol)
+        if buy_date is None:
             return True
 
         # 计算持仓天数
-        buy_date = self.buy_dates[symbol]
-        days_held = (current_date - buy_date).days
+        days_held = self._to_ordinal(current_date) - buy_date
 
         # T+1规则: 至少持有1天才能卖出
         can_sell = days_held >= 1
 
         if not can_sell:
-            logger.debug(f"T+1限制: {symbol} 买入日期{buy_date}, 当前{current_date}, 持仓{days_held}天, 不能卖出")
+            logger.debug(
+                f"T+1限制: {symbol} 买入日期{pd.Timestamp.fromordinal(buy_date).date()}, "
+                f"当前{pd.Timestamp.fromordinal(self._to_ordinal(current_date)).date()}, 持仓{days_held}天, 不能卖出"
+            )
 
         return can_sell
 
-    def record_buy(self, symbol: str, date: pd.Timestamp) -> None:
+    def record_buy(self, symbol: str, date: Union[pd.Timestamp, int]) -> None:
         """
         记录买入日期
 
         Args:
             symbol: 股票代码
-            date: 买入日期
+            date: 买入日期(Timestamp或公历序数)
         """
-        self.buy_dates[symbol] = date
-        logger.debug(f"T+1记录: {symbol} 买入于 {date}")
+        self.buy_dates[symbol] = self._to_ordinal(date)
+        logger.opt(lazy=True).debug(
+            "T+1记录: {} 买入于 {}", lambda: symbol, lambda: pd.Timestamp.fromordinal(self.buy_dates[symbol]).date()
+        )
 
     def remove_position(self, symbol: str) -> None:
         """
@@ -74,13 +88,13 @@ class TPlusOneTracker:
             del self.buy_dates[symbol]
             logger.debug(f"T+1移除: {symbol} 持仓记录已清除")
 
-    def get_holding_days(self, symbol: str, current_date: pd.Timestamp) -> int:
+    def get_holding_days(self, symbol: str, current_date: Union[pd.Timestamp, int]) -> int:
         """
         获取持仓天数
 
         Args:
             symbol: 股票代码
-            current_date: 当前日期
+            current_date: 当前日期(Timestamp或公历序数)
 
         Returns:
             int: 持仓天数,如果没有买入记录返回0
@@ -88,7 +102,7 @@ class TPlusOneTracker:
         if symbol not in self.buy_dates:
             return 0
 
-        return (current_date - self.buy_dates[symbol]).days
+        return self._to_ordinal(current_date) - self.buy_dates[symbol]
 
     def clear(self) -> None:
         """清空所有记录"""
@@ -255,6 +269,34 @@ class PriceLimitChecker:
 
         return is_hit, limit_type
 
+    def is_limit_hit_batch(self, symbols, order_prices, prev_closes,
+                           current_date: pd.Timestamp = None) -> np.ndarray:
+        """
+        批量检查订单价格是否触及涨跌停
+
+        Args:
+            symbols: 股票代码序列
+            order_prices: 订单价格数组
+            prev_closes: 前收盘价数组
+            current_date: 当前日期
+
+        Returns:
+            np.ndarray: 布尔数组, True表示触及涨跌停(前收盘价为0视为未触及)
+        """
+        order_prices = np.asarray(order_prices, dtype=float)
+        prev_closes = np.asarray(prev_closes, dtype=float)
+        limits = np.array([self.get_limit(symbol, current_date) for symbol in symbols], dtype=float)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change_pct = np.abs(order_prices - prev_closes) / prev_closes
+        is_hit = (prev_closes != 0) & (change_pct >= limits)
+
+        for i in np.flatnonzero(is_hit):
+            logger.warning(f"涨跌停限制: {symbols[i]} 价格{order_prices[i]:.2f} 前收{prev_closes[i]:.2f} "
+                         f"涨跌幅{change_pct[i]*100:.2f}% 限制{limits[i]*100:.1f}%")
+
+        return is_hit
+
     def get_limit_price(self, symbol: str, prev_close: float, direction: str,
                         current_date: pd.Timestamp = None) -> float:
         """
@@ -320,6 +362,18 @@ class LotSizeRounder:
         rounded = int(math.floor(size / self.lot_size) * self.lot_size)
         return rounded
 
+    def round_to_lot_array(self, sizes: np.ndarray) -> np.ndarray:
+        """
+        批量将数量调整为整手
+
+        Args:
+            sizes: 目标数量数组(股)
+
+        Returns:
+            np.ndarray: 调整后的整手数量数组(int64)
+        """
+        return (np.floor(sizes / self.lot_size) * self.lot_size).astype(np.int64)
+
     def adjust_order_size(self, target_value: float, price: float) -> Optional[int]:
         """
         根据目标金额计算整手数量
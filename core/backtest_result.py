@@ -449,7 +449,7 @@ def _normalize_statistics(value: Any) -> Dict[str, Any]:
     return {"value": _to_builtin_data(value)}
 
 
-@dataclass
+@dataclass(slots=True)
 class TradeRecord:
     """Normalized trade record."""
 
@@ -1,5 +1,4 @@
 import pandas as pd
-from matplotlib.font_manager import weight_dict
 
 
 class RunDaily:
@@ -299,7 +298,7 @@ class ReBalance:
                     'pos_to': 0,
                     'op': '平仓'
                 }
-                target.signals[date].append(close_signal)
+                target.signals.setdefault(date, []).append(close_signal)
 
                 target.close(data)
 
@@ -324,7 +323,7 @@ class ReBalance:
                     'pos_to': w,
                     'op': '减仓' if w >0 else '平仓'
                 }
-                target.signals[date].append(sell_signal)
+                target.signals.setdefault(date, []).append(sell_signal)
                 #target.weights[symbol]=w
 
                 target.order_target_percent(symbol, w)
@@ -342,7 +341,7 @@ class ReBalance:
                 'pos_to': w,
                 'op': '加仓' if pos_from >0 else '开仓'
             }
-            target.signals[date].append(buy_signal)
+            target.signals.setdefault(date, []).append(buy_signal)
             #target.weights[symbol] = w
             target.order_target_percent(s, w * 0.99)
         self.pre_symbols = set(target_weights.keys())
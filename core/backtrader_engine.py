@@ -10,16 +10,14 @@ from loguru import logger
 from core.backtrader_strategy import StrategyTemplate
 from core.backtrader_algos import *
 from core.backtest_result import BacktestResult
+from core.numba_kernels import build_hold_signal
 
 
 
-from matplotlib import rcParams
 from dataclasses import dataclass, field
 from datetime import datetime
 from collections import defaultdict
 
-rcParams['font.family'] = 'SimHei'
-
 
 @dataclass
 class Task:
@@ -118,8 +116,9 @@ class DataFeed:
         dfs = DbDataLoader(auto_download=False).read_dfs(symbols=task.symbols,start_date=task.start_date, end_date=task.end_date)
         logger.info(f"  [{task.name}] DataFeed: 原始数据加载完成, 耗时 {time.time() - datafeed_start:.2f}秒")
 
-        fields = list(set(task.select_buy + task.select_sell))
-        if task.order_by_signal:
+        # 按出现顺序去重, 同一公式(如同时出现在买入条件与排序因子中)只计算一次
+        fields = list(dict.fromkeys(task.select_buy + task.select_sell))
+        if task.order_by_signal and task.order_by_signal not in fields:
             fields += [task.order_by_signal]
         names = fields
 
@@ -127,6 +126,8 @@ class DataFeed:
         calc_start = time.time()
         df_all = FactorExpr().calc_formulas(dfs,fields)
         logger.info(f"  [{task.name}] DataFeed: 技术指标计算完成, 耗时 {time.time() - calc_start:.2f}秒, 数据量: {len(df_all)}行")
+        # (date, symbol)唯一, 预先建立有序MultiIndex, 取因子矩阵时直接unstack
+        df_all.set_index('symbol', append=True, inplace=True)
         self.df_all = df_all
 
         total_elapsed = time.time() - datafeed_start
@@ -137,7 +138,11 @@ class DataFeed:
         if col not in self.df_all.columns:
             logger.warning(f'Column {col} not found in computed factors')
             return None
-        df_factor = self.df_all.pivot_table(values=col, index=self.df_all.index, columns='symbol')
+        # unstack跳过pivot_table的分组聚合; 与pivot_table保持一致: 布尔因子转为0/1浮点, 剔除全空的行和列
+        factor = self.df_all[col]
+        if factor.dtype == bool:
+            factor = factor.astype(np.float64)
+        df_factor = factor.unstack('symbol').dropna(how='all').dropna(axis=1, how='all')
         if col == 'close':
             df_factor = df_factor.ffill()
         return df_factor
@@ -152,14 +157,13 @@ class Engine:
     def _parse_rules(self, task: Task):
 
         def _rules(rules, at_least):
-            if not rules or len(rules) == 0:
+            # 空规则直接返回, 不进入因子矩阵构建
+            rules = [r for r in rules if r] if rules else []
+            if len(rules) == 0:
                 return None
 
             all = None
             for r in rules:
-                if r == '':
-                    continue
-
                 df_r = self.datafeed.get_factor_df(r)
                 if df_r is not None:
                     df_r = df_r.replace({True: 1, False: 0})
@@ -202,16 +206,11 @@ class Engine:
         signal_buy, signal_sell = self._parse_rules(task)
         if signal_buy is not None or signal_sell is not None:  # 至少一个不为None
             df_close = self.datafeed.get_factor_df('close')
-            if signal_buy is None:
-                select_signal = np.ones(df_close.shape)  # 注意这里是全1，没有select_buy就是全选
-                select_signal = pd.DataFrame(select_signal, columns=df_close.columns, index=df_close.index)
-            else:
-                select_signal = np.where(signal_buy, 1, np.nan)  # 有select_buy的话，就是买入，否则选置Nan表示 hold状态不变
-            if signal_sell is not None:
-                select_signal = np.where(signal_sell, 0, select_signal)  # select_sell置为0，就是清仓或不选
+            # 一次扫描完成买卖信号合成与前向填充: 有select_buy置1, select_sell置0, 都不满足保持持仓状态不变
+            buy = None if signal_buy is None else signal_buy.to_numpy(dtype=np.bool_, na_value=False)
+            sell = None if signal_sell is None else signal_sell.to_numpy(dtype=np.bool_, na_value=False)
+            select_signal = build_hold_signal(buy, sell, df_close.shape)
             select_signal = pd.DataFrame(select_signal, index=df_close.index, columns=df_close.columns)
-            select_signal.ffill(inplace=True)  # 这一句非常关键，ffill就是前向填充，保持持仓状态不变。即不符合buy，也不符合sell，保持不变。
-            select_signal.fillna(0, inplace=True)
             algo_select_where = SelectWhere(signal=select_signal)
 
         # 排序因子
@@ -319,7 +318,7 @@ class Engine:
 
         #equity = (1 + returns).cumprod()
         self.perf = (1 + returns).cumprod().calc_stats()
-        self.hist_trades = [trade.to_dict() for trade in BacktestResult.normalize_trade_records(self.results[0].trade_list)]
+        self.hist_trades = [trade.to_dict() for trade in BacktestResult.normalize_trade_records(self.results[0].get_trade_df())]
         self.backtest_result = BacktestResult.from_common_inputs(
             statistics=self.perf.stats,
             equity_curve=self.perf.prices[['策略']] if hasattr(self.perf, 'prices') else (1 + returns).cumprod(),
@@ -413,7 +412,7 @@ class Engine:
         all_returns.dropna(inplace=True)
 
         self.perf = (1 + all_returns).cumprod().calc_stats()
-        normalized_trades = BacktestResult.normalize_trade_records(self.results[0].trade_list)
+        normalized_trades = BacktestResult.normalize_trade_records(self.results[0].get_trade_df())
         self.hist_trades = [trade.to_dict() for trade in reversed(normalized_trades)]
         self.signals = self.results[0].signals
         self.weights = self.results[0].weights
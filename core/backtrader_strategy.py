@@ -1,9 +1,10 @@
+from collections import OrderedDict
+
 import backtrader as bt
 import ffn
 import numpy as np
 import pandas as pd
 from loguru import logger
-from collections import defaultdict
 
 
 class StrategyTemplate(bt.Strategy):
@@ -25,11 +26,41 @@ class StrategyTemplate(bt.Strategy):
         ('enable_lot_rounding', True),# 启用手数调整
     )
 
+    ERC_SOLUTION_CACHE_SIZE = 32  # ERC热启动解缓存保留的资产集合数上限
+
     def __init__(self):
         self.last_month = None
-        self.trade_list = []  # 用于存储交易结果
-        self.signals = defaultdict(list) # 用于存储策略发出主动调仓指令
-        self.weights = defaultdict(str)
+        # 平仓交易按列存储(SoA), 回测结束后由get_trade_df一次性构建DataFrame
+        self.trade_cols = {
+            'symbol': [], 'shares': [], 'amount': [], 'buy_price': [], 'sell_price': [],
+            'pnl': [], 'pnl_comm': [], 'commission': [], 'dtopen': [], 'dtclose': [], 'holding_days': [],
+        }
+        self.signals = {} # 用于存储策略发出主动调仓指令
+        self.weights = {}
+
+        # 调仓向量化计算所需的索引表与缓冲区(按self.datas顺序)
+        self._data_index = {data: i for i, data in enumerate(self.datas)}
+        self._close_buf = np.empty(len(self.datas))
+        self._position_buf = np.empty(len(self.datas))
+        self._weight_buf = np.empty(len(self.datas))
+        self._prev_close_buf = np.empty(len(self.datas))
+        self._limit_hit_buf = np.zeros(len(self.datas), dtype=bool)
+        self._t1_blocked_buf = np.zeros(len(self.datas), dtype=bool)
+        self._data_names = [data._name for data in self.datas]
+        self._price_bufs = {}  # 风险平价收益率计算的价格矩阵缓存 {(窗口长度, 资产数): ndarray}
+
+        # ERC权重缓存: 按资产集合保存历史解用于CCD热启动(LRU, 最多保留ERC_SOLUTION_CACHE_SIZE个集合),
+        # 并缓存当前bar的计算结果
+        self._erc_solutions = OrderedDict()  # {frozenset(symbols): {symbol: weight}}
+        self._last_erc_solution = None
+        self._erc_cache_key = None
+        self._erc_cache_weights = None
+
+        # 等权权重按持仓数预先计算(0.98/n), 覆盖常见的topK规模
+        self._eq_weight_cache = [0.0] + [0.98 / n for n in range(1, 64)]
+
+        # 当前持仓集合 {symbol: data}, 在notify_order中增量维护(按建仓顺序)
+        self._held = {}
 
         # A股交易约束组件
         if self.p.ashare_mode:
@@ -61,44 +92,27 @@ class StrategyTemplate(bt.Strategy):
             self.limit_checker = None
             self.lot_rounder = None
 
-    def log(self, txt, dt=None):
-        dt = dt or self.datas[0].datetime.date(0)
-        print(f"{dt.isoformat()}, {txt}")
-
-
-
-    def notify_order(self, order):
-
-        """订单状态通知"""
-        if order.status in [order.Submitted, order.Accepted]:
-            return
-
-
-        if order.status in [order.Completed]:
-
-            if order.isbuy():
-                self.log(f"买入执行, 价格: {order.executed.price:.2f}, 数量: {order.executed.size}, 成本: {order.executed.value:.2f}, 佣金: {order.executed.comm:.2f}")
-                self.buy_price = order.executed.price
-                self.buy_date = self.datas[0].datetime.date(0)
+        # 缓存A股模式开关, 避免热点路径上反复解析self.p
+        self._ashare = bool(self.p.ashare_mode)
 
-                # A股模式: 记录买入日期用于T+1检查
-                if self.p.ashare_mode and self.t1_tracker:
-                    current_date = pd.Timestamp(self.datas[0].datetime.date(0))
-                    self.t1_tracker.record_buy(order.data._name, current_date)
+        # 当前bar日期缓存, 由_tick_date按backtrader浮点日期惰性刷新
+        self._today_num = None
+        self._today_int = None
+        self._today_ts = None
 
-            elif order.issell():
-                profit = order.executed.value - order.created.value
-                self.log(f"卖出执行, 价格: {order.executed.price:.2f}, 数量: {order.executed.size}, 收益: {profit:.2f}, 佣金: {order.executed.comm:.2f}")
-
-                # A股模式: 清仓时移除T+1记录
-                if self.p.ashare_mode and self.t1_tracker:
-                    # 检查是否完全清仓
-                    position = self.getposition(order.data)
-                    if position.size == 0:
-                        self.t1_tracker.remove_position(order.data._name)
+    def _tick_date(self):
+        """
+        当前bar日期, 每个bar只转换一次
 
-        elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log(f"订单取消/保证金不足/拒绝")
+        backtrader浮点日期的整数部分即公历序数, 同时缓存为self._today_int(供T+1跟踪器)
+        和self._today_ts(供涨跌停检查器)
+        """
+        num = self.datas[0].datetime[0]
+        if num != self._today_num:
+            self._today_num = num
+            self._today_int = int(num)
+            self._today_ts = pd.Timestamp.fromordinal(self._today_int)
+        return self._today_ts
 
     def select_all(self):
         return self.datas
@@ -134,6 +148,27 @@ class StrategyTemplate(bt.Strategy):
 
 
 
+    def _erc_initial_weights(self, columns):
+        """
+        CCD热启动初始权重
+
+        资产集合与历史某次调仓相同时直接复用上次的解; 与最近一次调仓的资产集合对称差不超过1个资产
+        (仅新增或仅移除1个)时, 将上次的解投影到新资产集合(新增资产取等权)后归一化;
+        否则返回None使用ffn默认初值
+        """
+        key = frozenset(columns)
+        previous = self._erc_solutions.get(key)
+        if previous is not None:
+            self._erc_solutions.move_to_end(key)
+        else:
+            previous = self._last_erc_solution
+            if previous is None or len(set(columns) ^ previous.keys()) > 1:
+                return None
+
+        n = len(columns)
+        initial_weights = np.array([previous.get(c, 1.0 / n) for c in columns])
+        return initial_weights / initial_weights.sum()
+
     def _calculate_erc_weights(self, returns_df):
         """调用ffn计算ERC权重"""
         try:
@@ -141,14 +176,30 @@ class StrategyTemplate(bt.Strategy):
             if not isinstance(returns_df, pd.DataFrame):
                 returns_df = pd.DataFrame(returns_df)
 
+            # 同一bar内相同资产组合重复调仓时直接复用结果(协方差与权重均不变)
+            columns = tuple(returns_df.columns)
+            cache_key = (self.datas[0].datetime[0], columns)
+            if self._erc_cache_key == cache_key:
+                return self._erc_cache_weights * 0.995
+
             weights = ffn.core.calc_erc_weights(
                 returns=returns_df,
-                initial_weights=None,  # self.initial_weights,
+                initial_weights=self._erc_initial_weights(columns),
                 covar_method=self.params.covar_method,
                 risk_parity_method='ccd',
                 maximum_iterations=self.params.max_iter,
                 tolerance=self.params.tol
             )
+
+            solution = dict(zip(columns, weights.values))
+            key = frozenset(columns)
+            self._erc_solutions[key] = solution
+            self._erc_solutions.move_to_end(key)
+            if len(self._erc_solutions) > self.ERC_SOLUTION_CACHE_SIZE:
+                self._erc_solutions.popitem(last=False)
+            self._last_erc_solution = solution
+            self._erc_cache_key = cache_key
+            self._erc_cache_weights = weights.values
             return weights.values * 0.995
         except Exception as e:
             print(f"计算ERC权重失败: {e}")
@@ -156,24 +207,26 @@ class StrategyTemplate(bt.Strategy):
 
     def _prepare_returns(self, data_selected):
         """收集历史数据并计算收益率"""
-        prices = []
-        valid_length = True
+        window = self.params.lookback + 1
 
         # 检查所有资产是否有足够数据
+        for data in data_selected:
+            if len(data) < window:
+                return None
+
+        # 价格矩阵按(窗口长度, 资产数)缓存复用, 逐列填入收盘价(从当前时刻回溯)
+        shape = (window, len(data_selected))
+        prices = self._price_bufs.get(shape)
+        if prices is None:
+            prices = self._price_bufs[shape] = np.empty(shape)
         for i, data in enumerate(data_selected):
-            if len(data) < self.params.lookback + 1:
-                valid_length = False
-                break
-            # 获取收盘价（从当前时刻回溯）
-            prices.append(data.close.get(size=self.params.lookback + 1))
-
-        if not valid_length:
-            return None
+            prices[:, i] = data.close.get(size=window)
 
-        # 转换为DataFrame并计算收益率
-        price_df = pd.DataFrame(np.array(prices).T)
-        returns = price_df.pct_change().dropna()
-        return returns
+        # 一次向量运算计算收益率, 仅在存在缺失值时才剔除对应行
+        returns = prices[1:] / prices[:-1] - 1.0
+        if np.isnan(returns).any():
+            returns = returns[~np.isnan(returns).any(axis=1)]
+        return pd.DataFrame(returns, columns=[data._name for data in data_selected])
 
     def weight_risk_parity(self, data_selected):
         df_returns = self._prepare_returns(data_selected)
@@ -182,11 +235,9 @@ class StrategyTemplate(bt.Strategy):
         return weights
 
     def weight_equally(self,selected):
-
-        weights = {}
-        for data in selected:
-            weights[data] = 0.98/len(selected)
-        return weights
+        n = len(selected)
+        w = self._eq_weight_cache[n] if n < len(self._eq_weight_cache) else 0.98 / n
+        return {data: w for data in selected}
 
     def rebalance(self, weights):
         """
@@ -201,79 +252,119 @@ class StrategyTemplate(bt.Strategy):
             weights: {data: weight} 目标权重字典
         """
         total_value = self.broker.getvalue()
-        to_buy = {}
-        current_date = pd.Timestamp(self.datas[0].datetime.date(0))
+        current_date = self._tick_date()
+        today_int = self._today_int
+
+        # A股约束组件在__init__中已按ashare_mode确定, 这里只绑定一次局部变量
+        ashare = self._ashare
+        t1_tracker = self.t1_tracker if ashare else None
+        lot_rounder = self.lot_rounder if ashare else None
+        limit_checker = self.limit_checker if ashare else None
+        datas = self.datas
+
+        # 快照收盘价与持仓数量(逐个读取不可避免), 之后的仓位计算全部为向量运算
+        closes = self._close_buf
+        positions = self._position_buf
+        for i, data in enumerate(datas):
+            closes[i] = data.close[0]
+            positions[i] = self.getposition(data).size
+
+        # 涨跌停检查所需的前收盘价, 每个bar只读取一次, 买卖分支共用
+        if limit_checker:
+            prev_closes = self._prev_close_buf
+            for i, data in enumerate(datas):
+                prev_closes[i] = data.close[-1] if len(data) > 1 else closes[i]
+
+        # 目标权重, 不在weights中的标的目标市值为0
+        target_weights = self._weight_buf
+        target_weights.fill(0.0)
+        for data, w in weights.items():
+            target_weights[self._data_index[data]] = w
+
+        # 计算需要交易的数量, 价格缺失(0或NaN)的标的不交易
+        with np.errstate(divide='ignore', invalid='ignore'):
+            size_diff = (total_value * target_weights - positions * closes) / closes
+        size_diff = np.nan_to_num(size_diff, nan=0.0, posinf=0.0, neginf=0.0)
+
+        # A股约束: 手数调整(买卖数量统一向下取整到整手)
+        sizes = np.abs(size_diff)
+        if lot_rounder:
+            sizes = lot_rounder.round_to_lot_array(sizes)
+
+        # A股约束: T+1检查, 先于涨跌停检查完成, 被T+1拦下的卖单不再参与涨跌停检查
+        sell_idx = np.flatnonzero(size_diff < 0)
+        if t1_tracker:
+            t1_blocked = self._t1_blocked_buf
+            t1_blocked.fill(False)
+            names = self._data_names
+            for i in sell_idx:
+                if not t1_tracker.can_sell(names[i], today_int, sizes[i]):
+                    t1_blocked[i] = True
+
+        # A股约束: 涨跌停检查, 对本bar全部待下单标的批量计算一次, 买卖分支共用
+        if limit_checker:
+            limit_hit = self._limit_hit_buf
+            limit_hit.fill(False)
+            order_mask = sizes > 0
+            if t1_tracker:
+                order_mask &= ~t1_blocked
+            order_idx = np.flatnonzero(order_mask)
+            if len(order_idx):
+                names = self._data_names
+                limit_hit[order_idx] = limit_checker.is_limit_hit_batch(
+                    [names[i] for i in order_idx], closes[order_idx], prev_closes[order_idx], current_date
+                )
+        sizes = sizes.tolist()
+
+        # 处理卖出订单
+        for i in sell_idx:
+            data = datas[i]
+            sell_size = sizes[i]
+
+            # A股约束1: T+1检查
+            if t1_tracker:
+                if t1_blocked[i]:
+                    logger.debug(f"跳过卖出 {data._name}: T+1限制")
+                    continue
+
+            # A股约束2: 手数调整
+            if lot_rounder:
+                if sell_size == 0:
+                    logger.debug(f"跳过卖出 {data._name}: 调整后为0股")
+                    continue
+
+            # A股约束3: 涨跌停检查
+            if limit_checker:
+                if limit_hit[i]:
+                    logger.warning(f"跳过卖出 {data._name}: 当前价格触及涨跌停")
+                    continue
+
+            self.sell(data=data, size=sell_size)
+
+        # 执行买入订单(卖出之后统一执行)
+        for i in np.flatnonzero(size_diff > 0):
+            data = datas[i]
+            size = sizes[i]
 
-        for i, data in enumerate(self.datas):
-            if data in weights.keys():
-                # 计算目标市值
-                target_value = total_value * weights[data]
-            else:
-                target_value = 0
-
-            # 计算当前持仓市值
-            current_value = self.getposition(data).size * data.close[0]
-
-            # 计算需要交易的数量
-            size_diff = (target_value - current_value) / data.close[0]
-
-            # 处理卖出订单
-            if size_diff < 0:
-                sell_size = abs(size_diff)
-
-                # A股约束1: T+1检查
-                if self.p.ashare_mode and self.t1_tracker:
-                    if not self.t1_tracker.can_sell(data._name, current_date, sell_size):
-                        logger.debug(f"跳过卖出 {data._name}: T+1限制")
-                        continue
-
-                # A股约束2: 手数调整
-                if self.p.ashare_mode and self.lot_rounder:
-                    sell_size = self.lot_rounder.round_to_lot(sell_size)
-                    if sell_size == 0:
-                        logger.debug(f"跳过卖出 {data._name}: 调整后为0股")
-                        continue
-
-                # A股约束3: 涨跌停检查
-                if self.p.ashare_mode and self.limit_checker:
-                    prev_close = data.close[-1] if len(data) > 1 else data.close[0]
-                    is_hit, _ = self.limit_checker.is_limit_hit(
-                        data._name, data.close[0], prev_close, current_date
-                    )
-                    if is_hit:
-                        logger.warning(f"跳过卖出 {data._name}: 当前价格触及涨跌停")
-                        continue
-
-                self.sell(data=data, size=sell_size)
-
-            # 收集买入订单(稍后统一执行)
-            elif size_diff > 0:
-                to_buy[data] = size_diff
-
-        # 执行买入订单
-        for data, size in to_buy.items():
             # A股约束: 手数调整
-            if self.p.ashare_mode and self.lot_rounder:
-                size = self.lot_rounder.round_to_lot(size)
+            if lot_rounder:
                 if size == 0:
                     logger.debug(f"跳过买入 {data._name}: 调整后为0股")
                     continue
 
             # A股约束: 涨跌停检查
-            if self.p.ashare_mode and self.limit_checker:
-                prev_close = data.close[-1] if len(data) > 1 else data.close[0]
-                is_hit, _ = self.limit_checker.is_limit_hit(
-                    data._name, data.close[0], prev_close, current_date
-                )
-                if is_hit:
+            if limit_checker:
+                if limit_hit[i]:
                     logger.warning(f"跳过买入 {data._name}: 当前价格触及涨跌停")
                     continue
 
             self.buy(data=data, size=size)
 
     def log(self, txt, dt=None):
-        dt = dt or self.datas[0].datetime.date(0)
-        logger.info('\n\n%s, %s' % (dt.isoformat(), txt))
+        # 延迟格式化: 日志级别被过滤时不读取日期也不拼接字符串
+        logger.opt(lazy=True).info(
+            '\n\n{}, {}', lambda: (dt or self.datas[0].datetime.date(0)).isoformat(), lambda: txt
+        )
 
     # 取当前的日期
     def get_current_dt(self):
@@ -284,19 +375,18 @@ class StrategyTemplate(bt.Strategy):
 
     # 取当前持仓的data列表
     def get_current_holding_datas(self):
-        holdings = []
-        for data in self.datas:
-            if self.getposition(data).size != 0:
-                holdings.append(data)
-        return holdings
+        return list(self._held.values())
 
     # 取当前持仓的data列表
     def get_current_holding_symbols(self):
-        holdings = []
-        for data in self.datas:
-            if self.getposition(data).size != 0:
-                holdings.append(data._name)
-        return holdings
+        return list(self._held)
+
+    def _update_holding(self, data):
+        """订单成交后增量维护持仓集合"""
+        if self.getposition(data).size != 0:
+            self._held[data._name] = data
+        else:
+            self._held.pop(data._name, None)
 
     def get_data_pos_percent(self, name):
         pos = self.getposition(name)
@@ -308,53 +398,57 @@ class StrategyTemplate(bt.Strategy):
         percent = data_value / total_value
         return percent
 
-    # 打印订单日志
+    # 订单通知: 维护持仓集合和T+1记录, 不做任何日志格式化
     def notify_order(self, order):
-        return
-        # if not self.show_info:
-        #     return
-
-        order_status = ['Created', 'Submitted', 'Accepted', 'Partial',
-                        'Completed', 'Canceled', 'Expired', 'Margin', 'Rejected']
-        # 未被处理的订单
-        if order.status in [order.Submitted, order.Accepted]:
-            return
-            self.log('未处理订单：订单号:%.0f, 标的: %s, 状态状态: %s' % (order.ref,
-                                                                         order.data._name,
-                                                                         order_status[order.status]))
+        if order.status not in [order.Partial, order.Completed]:
             return
-        # 已经处理的订单
-        if order.status in [order.Partial, order.Completed]:
-            #return
+
+        self._update_holding(order.data)
+
+        # A股模式: 买入完成时记录买入日期用于T+1检查, 卖出清仓时移除记录
+        t1_tracker = self.t1_tracker
+        if t1_tracker and order.status == order.Completed:
             if order.isbuy():
-                self.log(
-                    'BUY EXECUTED, 状态: %s, 订单号:%.0f, 标的: %s, 数量: %.2f, 价格: %.2f, 成本: %.2f, 手续费 %.2f' %
-                    (order_status[order.status],  # 订单状态
-                     order.ref,  # 订单编号
-                     order.data._name,  # 股票名称
-                     order.executed.size,  # 成交量
-                     order.executed.price,  # 成交价
-                     order.executed.value,  # 成交额
-                     order.executed.comm))  # 佣金
-            else:  # Sell
-
-                self.log(
-                    'SELL EXECUTED, status: %s, ref:%.0f, name: %s, Size: %.2f, Price: %.2f, Cost: %.2f, Comm %.2f' %
-                    (order_status[order.status],
-                     order.ref,
-                     order.data._name,
-                     order.executed.size,
-                     order.executed.price,
-                     order.executed.value,
-                     order.executed.comm))
-
-        elif order.status in [order.Canceled, order.Margin, order.Rejected, order.Expired]:
-            # order.Margin资金不足，订单无法成交
-            # 订单未完成
-            self.log('未完成订单，订单号:%.0f, 标的 : %s, 订单状态: %s' % (
-                order.ref, order.data._name, order_status[order.status]))
-
-        self.order = None
+                self._tick_date()
+                t1_tracker.record_buy(order.data._name, self._today_int)
+            elif order.data._name not in self._held:
+                t1_tracker.remove_position(order.data._name)
+
+    def get_trade_df(self):
+        """
+        由按列存储的平仓记录构建交易明细DataFrame
+
+        列与BacktestResult.normalize_trade_records兼容, 并保留中文列名
+        """
+        cols = self.trade_cols
+        dtopen = pd.DatetimeIndex(cols['dtopen'])
+        dtclose = pd.DatetimeIndex(cols['dtclose'])
+        buy_date = dtopen.strftime('%Y-%m-%d')
+        sell_date = dtclose.strftime('%Y-%m-%d')
+        return pd.DataFrame({
+            'symbol': cols['symbol'],
+            'action': 'roundtrip',
+            'date': sell_date,
+            'shares': cols['shares'],
+            'price': cols['sell_price'],
+            'amount': cols['amount'],
+            'commission': cols['commission'],
+            'pnl': cols['pnl'],
+            'pnl_comm': cols['pnl_comm'],
+            'buy_price': cols['buy_price'],
+            'sell_price': cols['sell_price'],
+            'buy_date': buy_date,
+            'sell_date': sell_date,
+            'holding_days': cols['holding_days'],
+            '买入价': cols['buy_price'],
+            '卖出价': cols['sell_price'],
+            '盈亏': cols['pnl'],
+            '盈亏（含佣金）': cols['pnl_comm'],
+            '佣金': cols['commission'],
+            '买入日期': dtopen,
+            '卖出日期': dtclose,
+            '持仓天数': cols['holding_days'],
+        })
 
     def notify_trade(self, trade):
         # if not self.show_info:
@@ -374,32 +468,19 @@ class StrategyTemplate(bt.Strategy):
             exit_price = self.getdatabyname(trade.getdataname()).close[0]
             holding_days = (dtclose - dtopen).days
 
-            # 收集交易信息
-            trade_info = {
-                'symbol': trade.getdataname(),
-                'action': 'roundtrip',
-                'date': dtclose.strftime('%Y-%m-%d'),
-                'shares': abs(int(trade.size)) if trade.size else 0,
-                'price': exit_price,
-                'amount': abs(int(trade.size)) * exit_price if trade.size else 0,
-                'commission': trade.commission,
-                'pnl': trade.pnl,
-                'pnl_comm': trade.pnlcomm,
-                'buy_price': trade.price,
-                'sell_price': exit_price,
-                'buy_date': dtopen.strftime('%Y-%m-%d'),
-                'sell_date': dtclose.strftime('%Y-%m-%d'),
-                'holding_days': holding_days,
-                '买入价': trade.price,
-                '卖出价': exit_price,
-                '盈亏': trade.pnl,
-                '盈亏（含佣金）': trade.pnlcomm,
-                '佣金': trade.commission,
-                '买入日期': dtopen,
-                '卖出日期': dtclose,
-                '持仓天数': holding_days,
-            }
-            self.trade_list.append(trade_info)
+            # 收集交易信息(逐列追加)
+            cols = self.trade_cols
+            cols['symbol'].append(trade.getdataname())
+            cols['shares'].append(abs(int(trade.size)) if trade.size else 0)
+            cols['amount'].append(abs(int(trade.size)) * exit_price if trade.size else 0)
+            cols['buy_price'].append(trade.price)
+            cols['sell_price'].append(exit_price)
+            cols['pnl'].append(trade.pnl)
+            cols['pnl_comm'].append(trade.pnlcomm)
+            cols['commission'].append(trade.commission)
+            cols['dtopen'].append(dtopen)
+            cols['dtclose'].append(dtclose)
+            cols['holding_days'].append(holding_days)
 
 
             # profit_loss = trade.pnl  # 毛利润
@@ -33,11 +33,8 @@ class SelectTopK(bt.AlgoStack):
             return True
         return True
 
-from matplotlib import rcParams
 from dataclasses import dataclass, field
 
-rcParams['font.family'] = 'SimHei'
-
 
 @dataclass
 class MultiStrategies:
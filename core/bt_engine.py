@@ -6,35 +6,17 @@ import numpy as np
 import pandas as pd
 from bt import Algo
 
+from core.numba_kernels import build_hold_signal
+from core.bt_algos_extend import SelectTopK
 
-class SelectTopK(bt.AlgoStack):
-    def __init__(self, signal, K=1, dropN=0, sort_descending=True, all_or_none=False, filter_selected=True):
-        super(SelectTopK, self).__init__(bt.algos.SetStat(signal),
-                                         bt.algos.SelectN(int(K) + int(dropN), sort_descending, all_or_none,
-                                                          filter_selected))
-        self.dropN = dropN
-
-    def __call__(self, target):
-        #print('selectTopK运行.....')
-        super(SelectTopK, self).__call__(target)
-
-        #print(target.now, target.temp['selected'])
-
-        if self.dropN > 0:
-            sel = target.temp["selected"]
-            if self.dropN >= len(sel):
-                target.temp['selected'] = []
-            else:
-                target.temp["selected"] = target.temp["selected"][self.dropN:]
-            print(target.now, target.temp['selected'])
-            return True
-        return True
-
-from matplotlib import rcParams
 from dataclasses import dataclass, field
 from datetime import datetime
 
-rcParams['font.family'] = 'SimHei'
+
+def _configure_cjk_fonts():
+    # 仅在绘图时加载matplotlib并设置中文字体, 纯回测/批量运行不付出导入开销
+    from matplotlib import rcParams
+    rcParams['font.family'] = 'SimHei'
 
 
 @dataclass
@@ -79,11 +61,14 @@ class DataFeed:
     def __init__(self, task: Task):
         dfs = DbDataLoader().read_dfs(symbols=task.symbols,start_date=task.start_date, end_date=task.end_date)
 
-        fields = list(set(task.select_buy + task.select_sell))
-        if task.order_by_signal:
+        # 按出现顺序去重, 同一公式(如同时出现在买入条件与排序因子中)只计算一次
+        fields = list(dict.fromkeys(task.select_buy + task.select_sell))
+        if task.order_by_signal and task.order_by_signal not in fields:
             fields += [task.order_by_signal]
         names = fields
         df_all = FactorExpr().calc_formulas(dfs,fields)
+        # (date, symbol)唯一, 预先建立有序MultiIndex, 取因子矩阵时直接unstack
+        df_all.set_index('symbol', append=True, inplace=True)
         self.df_all = df_all
         #self.df_all.to_csv('df_all.csv')
 
@@ -91,7 +76,11 @@ class DataFeed:
         if col not in self.df_all.columns:
             print(f'{col}不存在')
             return None
-        df_factor = self.df_all.pivot_table(values=col, index=self.df_all.index, columns='symbol')
+        # unstack跳过pivot_table的分组聚合; 与pivot_table保持一致: 布尔因子转为0/1浮点, 剔除全空的行和列
+        factor = self.df_all[col]
+        if factor.dtype == bool:
+            factor = factor.astype(np.float64)
+        df_factor = factor.unstack('symbol').dropna(how='all').dropna(axis=1, how='all')
         if col == 'close':
             df_factor = df_factor.ffill()
         return df_factor
@@ -107,14 +96,13 @@ class Engine:
     def _parse_rules(self, task: Task):
 
         def _rules(rules, at_least):
-            if not rules or len(rules) == 0:
+            # 空规则直接返回, 不进入因子矩阵构建
+            rules = [r for r in rules if r] if rules else []
+            if len(rules) == 0:
                 return None
 
             all = None
             for r in rules:
-                if r == '':
-                    continue
-
                 df_r = self.datafeed.get_factor_df(r)
                 if df_r is not None:
                     df_r = df_r.replace({True: 1, False: 0})
@@ -156,17 +144,12 @@ class Engine:
         # 信号规则
         signal_buy, signal_sell = self._parse_rules(task)
         if signal_buy is not None or signal_sell is not None:  # 至少一个不为None
-            df_close = self.datafeed.get_factor_df('close')
-            if signal_buy is None:
-                select_signal = np.ones(df_close.shape)  # 注意这里是全1，没有select_buy就是全选
-                select_signal = pd.DataFrame(select_signal, columns=df_close.columns, index=df_close.index)
-            else:
-                select_signal = np.where(signal_buy, 1, np.nan)  # 有select_buy的话，就是买入，否则选置Nan表示 hold状态不变
-            if signal_sell is not None:
-                select_signal = np.where(signal_sell, 0, select_signal)  # select_sell置为0，就是清仓或不选
+            df_close = self._df_close
+            # 一次扫描完成买卖信号合成与前向填充: 有select_buy置1, select_sell置0, 都不满足保持持仓状态不变
+            buy = None if signal_buy is None else signal_buy.to_numpy(dtype=np.bool_, na_value=False)
+            sell = None if signal_sell is None else signal_sell.to_numpy(dtype=np.bool_, na_value=False)
+            select_signal = build_hold_signal(buy, sell, df_close.shape)
             select_signal = pd.DataFrame(select_signal, index=df_close.index, columns=df_close.columns)
-            select_signal.ffill(inplace=True)  # 这一句非常关键，ffill就是前向填充，保持持仓状态不变。即不符合buy，也不符合sell，保持不变。
-            select_signal.fillna(0, inplace=True)
             algo_select_where = bt.algos.SelectWhere(signal=select_signal)
 
         # 排序因子
@@ -213,13 +196,14 @@ class Engine:
 
         s = bt.Strategy(task.name, self._get_algos(task))
 
-        df_close = self.datafeed.get_factor_df('close')
-        bkt = bt.Backtest(s, df_close, name='策略', integer_positions=True, commissions=self.commissions )
+        bkt = bt.Backtest(s, self._df_close, name='策略', integer_positions=True, commissions=self.commissions )
         return bkt
 
     def run(self, task: Task, commissions=None):
         self.commissions = commissions
         self.datafeed = DataFeed(task)
+        # 收盘价矩阵只构建一次, 信号对齐与bt.Backtest共用同一对象
+        self._df_close = self.datafeed.get_factor_df('close')
 
         bkt = self._get_bkt(task)
 
@@ -291,5 +275,6 @@ if __name__ == '__main__':
     # print(res.get_security_weights().iloc[-1].to_dict())
     # print(res.get_weights())
     import matplotlib.pyplot as plt
+    _configure_cjk_fonts()
     res.plot()
     plt.show()
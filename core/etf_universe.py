@@ -13,11 +13,13 @@ ETF池管理器 - ETF Universe Manager
 import pandas as pd
 import time
 from datetime import datetime, date, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union, FrozenSet
 from loguru import logger
+from sqlalchemy import func, select
 from sqlalchemy.exc import OperationalError, DBAPIError
 
 from database.pg_manager import get_db
+from database.models import EtfHistory
 
 
 class EtfUniverse:
@@ -35,6 +37,10 @@ class EtfUniverse:
     - 使用etf_history表数据
     """
 
+    # get_all_etfs结果的进程内TTL缓存, 所有实例共享: {min_data_days: (symbols, symbol_set, 写入时间)}
+    CACHE_TTL = 3600
+    _etf_cache: Dict[int, tuple] = {}
+
     def __init__(self, db=None):
         """
         初始化ETF池管理器
@@ -45,56 +51,138 @@ class EtfUniverse:
         self.db = db if db else get_db()
         logger.debug('ETF池管理器初始化完成')
 
-    def get_all_etfs(self, min_data_days: int = 180) -> List[str]:
+    @classmethod
+    def invalidate_cache(cls) -> None:
+        """清空get_all_etfs缓存(etf_history数据更新后调用)"""
+        cls._etf_cache.clear()
+        logger.debug('ETF池缓存已清空')
+
+    def get_all_etfs(self, min_data_days: int = 180, use_cache: bool = True,
+                     as_set: bool = False) -> Union[List[str], FrozenSet[str]]:
         """
         从etf_history表获取有足够数据的ETF
 
+        全表GROUP BY代价较高且结果按天变化, 按min_data_days缓存CACHE_TTL秒
+
         Args:
             min_data_days: 最小历史数据天数,默认180天(半年)
+            use_cache: 是否使用缓存结果
+            as_set: 返回frozenset, 供调用方做成员判断/取交集(与缓存共享, 不再重建)
 
         Returns:
-            ETF代码列表
+            ETF代码列表(as_set=True时为frozenset)
         """
-        try:
-            from database.models import EtfHistory
+        if use_cache:
+            cached = self._etf_cache.get(min_data_days)
+            if cached is not None and time.time() - cached[2] < self.CACHE_TTL:
+                logger.debug('使用缓存的ETF列表: {}只', len(cached[0]))
+                return cached[1] if as_set else list(cached[0])
 
+        try:
             with self.db.get_session() as session:
                 # 从etf_history表查询有足够数据的ETF
                 # 统计每个ETF的总交易天数(使用所有历史数据)
-                from sqlalchemy import func
 
-                # 统计每个ETF的总数据天数（使用distinct去重日期）
-                subquery = session.query(
-                    EtfHistory.symbol,
-                    func.count(func.distinct(EtfHistory.date)).label('total_days')
+                # 统计每个ETF的总数据天数
+                # (symbol, date)有唯一约束, 行数即去重后的天数; 用COUNT(*)省去DISTINCT的逐组排序,
+                # 可直接走idx_etf_symbol_date索引
+                stmt = select(
+                    EtfHistory.symbol
                 ).group_by(
                     EtfHistory.symbol
                 ).having(
-                    func.count(func.distinct(EtfHistory.date)) >= min_data_days  # 至少有min_data_days天数据
+                    func.count() >= min_data_days  # 至少有min_data_days天数据
                 )
 
-                # 获取符合条件的ETF代码
-                results = subquery.all()
-                symbols = [r[0] for r in results]
+                # 获取符合条件的ETF代码(单列结果直接取标量, 不构造Row)
+                symbols = list(session.execute(stmt).scalars().all())
+                symbol_set = frozenset(symbols)
 
                 logger.info(f'获取有{min_data_days}天以上数据的ETF: {len(symbols)}只')
-                return symbols
+                self._etf_cache[min_data_days] = (tuple(symbols), symbol_set, time.time())
+                return symbol_set if as_set else symbols
 
         except Exception as e:
             logger.error(f'获取ETF列表失败: {e}')
-            return []
+            return frozenset() if as_set else []
+
+    @staticmethod
+    def _compute_window(days: int) -> tuple:
+        """
+        计算最近days个交易日对应的日期范围
+
+        按日历天预留节假日余量, 链式筛选时只计算一次, 各步骤使用同一窗口
+
+        Args:
+            days: 统计交易日数
+
+        Returns:
+            (start_date, end_date)
+        """
+        end_date = date.today()
+        start_date = end_date - timedelta(days=days * 7 // 5 + 10)
+        return start_date, end_date
+
+    def _avg_by_symbol(self, symbols: List[str], columns: List[str], days: int,
+                       start_date: Optional[date] = None,
+                       end_date: Optional[date] = None) -> Dict[str, tuple]:
+        """
+        在数据库端按ETF汇总最近days个交易日各列的均值, 不把逐日数据拉回本地
+
+        每个ETF按日期倒序编号(ROW_NUMBER), 只取前days行参与汇总;
+        日期范围按日历天预留节假日余量, 保证走(symbol, date)索引且剔除长期无数据的ETF
+
+        Args:
+            symbols: ETF列表
+            columns: etf_history中需要求均值的列名
+            days: 统计交易日数
+            start_date: 日期范围起点, 为None时由_compute_window(days)计算
+            end_date: 日期范围终点, 为None时由_compute_window(days)计算
+
+        Returns:
+            {symbol: (各列均值, ...)}, 均值为None表示该列数据全为空
+        """
+        if start_date is None or end_date is None:
+            start_date, end_date = self._compute_window(days)
+
+        recent = select(
+            EtfHistory.symbol,
+            *[getattr(EtfHistory, col).label(col) for col in columns],
+            func.row_number().over(
+                partition_by=EtfHistory.symbol,
+                order_by=EtfHistory.date.desc()
+            ).label('rn')
+        ).where(
+            EtfHistory.symbol.in_(symbols),
+            EtfHistory.date >= start_date,
+            EtfHistory.date <= end_date,
+        ).subquery()
+
+        stmt = select(
+            recent.c.symbol,
+            *[func.avg(recent.c[col]) for col in columns]
+        ).where(
+            recent.c.rn <= days
+        ).group_by(recent.c.symbol)
+
+        with self.db.get_session() as session:
+            return {row[0]: tuple(row[1:]) for row in session.execute(stmt)}
 
     def filter_by_liquidity(self,
                            symbols: List[str],
                            min_avg_amount: float = 5000,
-                           days: int = 20) -> List[str]:
+                           days: int = 20,
+                           start_date: Optional[date] = None,
+                           end_date: Optional[date] = None) -> List[str]:
         """
         按成交额筛选ETF
 
         Args:
             symbols: 初始ETF列表
             min_avg_amount: 最小日均成交额(万元),默认5000万
-            days: 统计天数,默认20天
+            days: 统计交易日数,默认20天
+            start_date: 统计日期范围起点,默认按days计算
+            end_date: 统计日期范围终点,默认今天
 
         Returns:
             筛选后的ETF列表
@@ -103,50 +191,21 @@ class EtfUniverse:
             return []
 
         try:
-            from datafeed.db_dataloader import DbDataLoader
-
-            # 计算日期范围
-            end_date = datetime.now().strftime('%Y%m%d')
-            start_date = (datetime.strptime(end_date, '%Y%m%d') -
-                         timedelta(days=days)).strftime('%Y%m%d')
+            # 数据库端计算每个ETF的平均成交额(万元)
+            averages = self._avg_by_symbol(symbols, ['amount'], days, start_date, end_date)
 
-            # 批量获取历史数据
-            loader = DbDataLoader(auto_download=False)
-            dfs = loader.read_dfs(
-                symbols=symbols,
-                start_date=start_date,
-                end_date=end_date
-            )
-
-            if not dfs:
+            if not averages:
                 logger.warning("未能加载ETF数据")
                 return symbols
 
-            # 计算每个ETF的平均成交额
+            # 筛选(保持输入顺序), 无数据或全为空的ETF剔除
             qualified = []
             for symbol in symbols:
-                if symbol not in dfs:
-                    continue
-
-                df = dfs[symbol]
-                if df.empty or 'amount' not in df.columns:
-                    continue
-
-                # 计算平均成交额(万元)
-                recent_amount = df['amount'].tail(days)
-
-                # 检查数据是否为空或全为NaN
-                if recent_amount.empty or recent_amount.isna().all():
-                    logger.debug(f'{symbol}: 成交额数据为空或全NaN，跳过')
-                    continue
-
-                avg_amount = recent_amount.mean()
-
-                # 筛选
-                if pd.notna(avg_amount) and avg_amount >= min_avg_amount:
+                avg_amount = averages.get(symbol, (None,))[0]
+                if avg_amount is not None and avg_amount >= min_avg_amount:
                     qualified.append(symbol)
 
-            logger.debug(f'成交额筛选(>={min_avg_amount}万): {len(symbols)} -> {len(qualified)}')
+            logger.debug('成交额筛选(>={}万): {} -> {}', min_avg_amount, len(symbols), len(qualified))
             return qualified
 
         except Exception as e:
@@ -156,14 +215,18 @@ class EtfUniverse:
     def filter_by_turnover_rate(self,
                                symbols: List[str],
                                min_turnover: float = 1.0,
-                               days: int = 20) -> List[str]:
+                               days: int = 20,
+                               start_date: Optional[date] = None,
+                               end_date: Optional[date] = None) -> List[str]:
         """
         按换手率筛选ETF
 
         Args:
             symbols: 初始ETF列表
             min_turnover: 最小平均换手率(%),默认1.0%
-            days: 统计天数,默认20天
+            days: 统计交易日数,默认20天
+            start_date: 统计日期范围起点,默认按days计算
+            end_date: 统计日期范围终点,默认今天
 
         Returns:
             筛选后的ETF列表
@@ -172,54 +235,77 @@ class EtfUniverse:
             return []
 
         try:
-            from datafeed.db_dataloader import DbDataLoader
-
-            # 计算日期范围
-            end_date = datetime.now().strftime('%Y%m%d')
-            start_date = (datetime.strptime(end_date, '%Y%m%d') -
-                         timedelta(days=days)).strftime('%Y%m%d')
+            # 数据库端计算每个ETF的平均换手率
+            averages = self._avg_by_symbol(symbols, ['turnover_rate'], days, start_date, end_date)
 
-            # 批量获取历史数据
-            loader = DbDataLoader(auto_download=False)
-            dfs = loader.read_dfs(
-                symbols=symbols,
-                start_date=start_date,
-                end_date=end_date
-            )
-
-            if not dfs:
+            if not averages:
                 logger.warning("未能加载ETF数据")
                 return symbols
 
-            # 计算每个ETF的平均换手率
+            # 筛选(保持输入顺序), 无数据或全为空的ETF剔除
             qualified = []
             for symbol in symbols:
-                if symbol not in dfs:
-                    continue
+                avg_turnover = averages.get(symbol, (None,))[0]
+                if avg_turnover is not None and avg_turnover >= min_turnover:
+                    qualified.append(symbol)
 
-                df = dfs[symbol]
-                if df.empty or 'turnover_rate' not in df.columns:
-                    continue
+            logger.debug('换手率筛选(>={}%): {} -> {}', min_turnover, len(symbols), len(qualified))
+            return qualified
 
-                # 计算平均换手率
-                recent_turnover = df['turnover_rate'].tail(days)
+        except Exception as e:
+            logger.error(f'换手率筛选失败: {e}')
+            return symbols
 
-                # 检查数据是否为空或全为NaN
-                if recent_turnover.empty or recent_turnover.isna().all():
-                    logger.debug(f'{symbol}: 换手率数据为空或全NaN，跳过')
-                    continue
+    def filter_by_liquidity_and_turnover(self,
+                                         symbols: List[str],
+                                         min_avg_amount: float = 5000,
+                                         min_turnover: float = 1.0,
+                                         days: int = 20,
+                                         start_date: Optional[date] = None,
+                                         end_date: Optional[date] = None) -> List[str]:
+        """
+        一次查询同时按成交额和换手率筛选ETF
 
-                avg_turnover = recent_turnover.mean()
+        结果与依次调用filter_by_liquidity和filter_by_turnover_rate相同, 但只扫描一次etf_history
 
-                # 筛选
-                if pd.notna(avg_turnover) and avg_turnover >= min_turnover:
-                    qualified.append(symbol)
+        Args:
+            symbols: 初始ETF列表
+            min_avg_amount: 最小日均成交额(万元),默认5000万
+            min_turnover: 最小平均换手率(%),默认1.0%
+            days: 统计交易日数,默认20天
+            start_date: 统计日期范围起点,默认按days计算
+            end_date: 统计日期范围终点,默认今天
 
-            logger.debug(f'换手率筛选(>={min_turnover}%): {len(symbols)} -> {len(qualified)}')
+        Returns:
+            筛选后的ETF列表
+        """
+        if not symbols:
+            return []
+
+        try:
+            # 数据库端一次计算平均成交额与平均换手率
+            averages = self._avg_by_symbol(symbols, ['amount', 'turnover_rate'], days, start_date, end_date)
+
+            if not averages:
+                logger.warning("未能加载ETF数据")
+                return symbols
+
+            qualified = []
+            for symbol in symbols:
+                avg_amount, avg_turnover = averages.get(symbol, (None, None))
+                if avg_amount is None or avg_amount < min_avg_amount:
+                    continue
+                if avg_turnover is None or avg_turnover < min_turnover:
+                    continue
+                qualified.append(symbol)
+
+            # 日志参数交给loguru, 级别被过滤时不做字符串格式化
+            logger.debug('成交额+换手率筛选(>={}万, >={}%): {} -> {}',
+                         min_avg_amount, min_turnover, len(symbols), len(qualified))
             return qualified
 
         except Exception as e:
-            logger.error(f'换手率筛选失败: {e}')
+            logger.error(f'成交额+换手率筛选失败: {e}')
             return symbols
 
     def get_etf_pool(self,
@@ -234,12 +320,11 @@ class EtfUniverse:
             min_data_days: 最小历史数据天数
             min_avg_amount: 最小日均成交额(万元)
             min_turnover: 最小平均换手率(%)
-            liquidity_days: 流动性统计天数
+            liquidity_days: 流动性统计交易日数
 
         Returns:
             筛选后的ETF列表
         """
-        import time
         start_time = time.time()
 
         logger.info("=" * 60)
@@ -253,24 +338,47 @@ class EtfUniverse:
             logger.warning("没有符合数据要求的ETF")
             return []
 
+        # 统计窗口只计算一次, 各筛选步骤共用(避免跨零点时窗口不一致)
+        start_date, end_date = self._compute_window(liquidity_days)
+
+        # 两个阈值都启用时合并为一次查询
+        if min_avg_amount > 0 and min_turnover > 0:
+            symbols = self.filter_by_liquidity_and_turnover(
+                symbols=symbols,
+                min_avg_amount=min_avg_amount,
+                min_turnover=min_turnover,
+                days=liquidity_days,
+                start_date=start_date,
+                end_date=end_date
+            )
+            logger.info(f"✓ 成交额+换手率筛选: {len(symbols)} 只ETF")
+
         # 按成交额筛选
-        if min_avg_amount > 0:
+        elif min_avg_amount > 0:
             symbols = self.filter_by_liquidity(
                 symbols=symbols,
                 min_avg_amount=min_avg_amount,
-                days=liquidity_days
+                days=liquidity_days,
+                start_date=start_date,
+                end_date=end_date
             )
             logger.info(f"✓ 成交额筛选: {len(symbols)} 只ETF")
 
         # 按换手率筛选
-        if min_turnover > 0:
+        elif min_turnover > 0:
             symbols = self.filter_by_turnover_rate(
                 symbols=symbols,
                 min_turnover=min_turnover,
-                days=liquidity_days
+                days=liquidity_days,
+                start_date=start_date,
+                end_date=end_date
             )
             logger.info(f"✓ 换手率筛选: {len(symbols)} 只ETF")
 
+        if not symbols:
+            logger.warning("没有满足流动性要求的ETF")
+            return []
+
         elapsed = time.time() - start_time
         logger.success(f"✓ 筛选完成! 最终: {len(symbols)} 只ETF, 耗时 {elapsed:.2f}秒")
         logger.info("=" * 60)
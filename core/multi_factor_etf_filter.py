@@ -172,8 +172,9 @@ class MultiFactorETFFilter:
         """获取基础ETF池"""
         if initial_symbols:
             # 验证数据可用性
-            all_etfs = self.universe.get_all_etfs(min_data_days=self.config.min_data_days)
-            return list(set(initial_symbols) & set(all_etfs))
+            valid_etfs = self.universe.get_all_etfs(min_data_days=self.config.min_data_days, as_set=True)
+            # 保持初始列表顺序(去重)
+            return [s for s in dict.fromkeys(initial_symbols) if s in valid_etfs]
         else:
             # 使用全市场ETF
             return self.universe.get_all_etfs(min_data_days=self.config.min_data_days)
@@ -0,0 +1,317 @@
+"""
+Numba 加速计算内核
+
+回测热点路径上的矩阵计算内核:
+- 买卖信号合成 + 前向填充(持仓状态保持)
+- ATR(真实波幅滚动均值)序列
+- 收益率统计量(均值/标准差/下行标准差)单次遍历
+- 超额收益均值/标准差单次遍历(不生成超额收益数组)
+- 拼接数组上按段计算尾部窗口均值(多标的流动性统计)
+
+numba未安装时自动退化为等价的NumPy向量化实现
+"""
+
+import numpy as np
+from loguru import logger
+
+try:
+    from numba import njit, prange
+except ImportError:
+    logger.warning("numba未安装,将使用NumPy实现(性能较低)")
+    njit = None
+    prange = range
+
+NUMBA_AVAILABLE = njit is not None
+
+
+def _build_hold_signal_numpy(buy, sell, out):
+    """NumPy实现: 卖出优先, 无信号时保持上一状态, 初始为空仓"""
+    # int8状态: 1买入, 0卖出, -1无变化
+    state = np.where(sell, np.int8(0), np.where(buy, np.int8(1), np.int8(-1)))
+    rows = np.arange(state.shape[0])[:, None]
+    last_idx = np.where(state < 0, 0, rows)
+    np.maximum.accumulate(last_idx, axis=0, out=last_idx)
+    filled = state[last_idx, np.arange(state.shape[1])]
+    np.equal(filled, 1, out=out)
+    return out
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True)
+    def _build_hold_signal_kernel(buy, sell, out):
+        """逐列扫描一次, 携带上一状态, 等价于 where(buy,1,nan) -> where(sell,0) -> ffill -> fillna(0)"""
+        n_rows, n_cols = buy.shape
+        for j in prange(n_cols):
+            state = False
+            for t in range(n_rows):
+                if sell[t, j]:
+                    state = False
+                elif buy[t, j]:
+                    state = True
+                out[t, j] = state
+        return out
+else:
+    _build_hold_signal_kernel = _build_hold_signal_numpy
+
+
+def _rolling_atr_numpy(high, low, close, period, out):
+    """NumPy实现: TR取三者最大值(忽略NaN), 再取最近period个TR的均值"""
+    prev_close = np.empty_like(close)
+    prev_close[0] = np.nan
+    prev_close[1:] = close[:-1]
+    tr = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+    out[:] = np.nan
+    if len(tr) > period:
+        windows = np.lib.stride_tricks.sliding_window_view(tr, period)
+        out[period:] = windows[1:].mean(axis=1)
+    return out
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _rolling_atr_kernel(high, low, close, period, out):
+        """逐行计算TR后按窗口求均值, 窗口内存在NaN时结果为NaN"""
+        n = high.shape[0]
+        tr = np.empty(n)
+        for t in range(n):
+            value = high[t] - low[t]
+            if t > 0:
+                for v in (abs(high[t] - close[t - 1]), abs(low[t] - close[t - 1])):
+                    if np.isnan(value) or v > value:
+                        value = v
+            tr[t] = value
+        for t in range(n):
+            if t < period:
+                out[t] = np.nan
+                continue
+            total = 0.0
+            for k in range(t - period + 1, t + 1):
+                total += tr[k]
+            out[t] = total / period
+        return out
+else:
+    _rolling_atr_kernel = _rolling_atr_numpy
+
+
+def rolling_atr(high, low, close, period=14):
+    """
+    计算整段行情的ATR序列
+
+    与逐日截取最近period+1根K线再计算的结果一致:
+    - TR = max(high-low, |high-前收|, |low-前收|), 忽略NaN
+    - 第t行ATR为第t-period+1至t行TR的均值, 前period行(数据不足)为NaN
+
+    Args:
+        high: 最高价序列
+        low: 最低价序列
+        close: 收盘价序列
+        period: ATR周期
+
+    Returns:
+        np.ndarray: float64 ATR序列, 与输入等长
+    """
+    high = np.ascontiguousarray(high, dtype=np.float64)
+    low = np.ascontiguousarray(low, dtype=np.float64)
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    out = np.empty(high.shape[0], dtype=np.float64)
+    return _rolling_atr_kernel(high, low, close, int(period), out)
+
+
+def _return_stats_numpy(returns):
+    """NumPy实现: 与returns.std()及returns[returns<0].std()口径一致(总体标准差)"""
+    n = len(returns)
+    if n == 0:
+        return np.nan, np.nan, 0.0, 0
+    downside = returns[returns < 0]
+    downside_std = downside.std() if len(downside) > 0 else 0.0
+    return returns.mean(), returns.std(), downside_std, len(downside)
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _return_stats_kernel(returns):
+        """Welford在线算法单次遍历, 同时累计全部收益与负收益的均值和二阶中心矩"""
+        n = 0
+        mean = 0.0
+        m2 = 0.0
+        n_down = 0
+        down_mean = 0.0
+        down_m2 = 0.0
+        for x in returns:
+            n += 1
+            delta = x - mean
+            mean += delta / n
+            m2 += delta * (x - mean)
+            if x < 0:
+                n_down += 1
+                delta = x - down_mean
+                down_mean += delta / n_down
+                down_m2 += delta * (x - down_mean)
+        if n == 0:
+            return np.nan, np.nan, 0.0, 0
+        downside_std = np.sqrt(down_m2 / n_down) if n_down > 0 else 0.0
+        return mean, np.sqrt(m2 / n), downside_std, n_down
+else:
+    _return_stats_kernel = _return_stats_numpy
+
+
+def return_stats(returns):
+    """
+    计算收益率序列的基础统计量
+
+    Args:
+        returns: 日收益率序列
+
+    Returns:
+        tuple: (均值, 标准差, 下行标准差, 负收益天数), 标准差均为总体标准差(ddof=0),
+               无负收益时下行标准差为0
+    """
+    returns = np.ascontiguousarray(returns, dtype=np.float64)
+    mean, std, downside_std, n_down = _return_stats_kernel(returns)
+    return float(mean), float(std), float(downside_std), int(n_down)
+
+
+def _excess_return_stats_numpy(returns, benchmark):
+    """NumPy实现: 先求超额收益数组再求均值和总体标准差"""
+    excess = returns - benchmark
+    return excess.mean(), excess.std()
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _excess_return_stats_kernel(returns, benchmark):
+        """Welford在线算法逐元素累计超额收益, 不分配中间数组"""
+        mean = 0.0
+        m2 = 0.0
+        n = returns.shape[0]
+        for i in range(n):
+            x = returns[i] - benchmark[i]
+            delta = x - mean
+            mean += delta / (i + 1)
+            m2 += delta * (x - mean)
+        if n == 0:
+            return np.nan, np.nan
+        return mean, np.sqrt(m2 / n)
+else:
+    _excess_return_stats_kernel = _excess_return_stats_numpy
+
+
+def excess_return_stats(returns, benchmark):
+    """
+    计算超额收益(策略收益 - 基准收益)的均值和总体标准差
+
+    Args:
+        returns: 策略日收益率序列
+        benchmark: 基准日收益率序列, 与returns等长
+
+    Returns:
+        tuple: (均值, 标准差)
+    """
+    returns = np.ascontiguousarray(returns, dtype=np.float64)
+    benchmark = np.ascontiguousarray(benchmark, dtype=np.float64)
+    mean, std = _excess_return_stats_kernel(returns, benchmark)
+    return float(mean), float(std)
+
+
+def _tail_means_numpy(values, offsets, window, out):
+    """NumPy实现: reduceat一次求出各段尾部区间的和与非NaN个数"""
+    lengths = np.diff(offsets)
+    starts = offsets[1:] - np.minimum(lengths, window)
+    bounds = np.column_stack([starts, offsets[1:]]).ravel()
+
+    # 末尾补一行0, 使最后一段的end可作为reduceat下标; 奇数位是段与段之间的间隔, 丢弃
+    valid = ~np.isnan(values)
+    pad = np.zeros((1, values.shape[1]))
+    sums = np.add.reduceat(np.vstack([np.where(valid, values, 0.0), pad]), bounds, axis=0)[::2]
+    counts = np.add.reduceat(np.vstack([valid, pad]), bounds, axis=0)[::2]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        np.divide(sums, counts, out=out)
+    # 空段在reduceat中取到的是下一行的值, 置为NaN
+    out[lengths == 0] = np.nan
+    return out
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, nogil=True, cache=True)
+    def _tail_means_kernel(values, offsets, window, out):
+        """各段并行, 段内逐列累加最近window行的非NaN值"""
+        n_cols = values.shape[1]
+        for i in prange(offsets.shape[0] - 1):
+            end = offsets[i + 1]
+            start = max(offsets[i], end - window)
+            for j in range(n_cols):
+                total = 0.0
+                count = 0
+                for t in range(start, end):
+                    x = values[t, j]
+                    if not np.isnan(x):
+                        total += x
+                        count += 1
+                out[i, j] = total / count if count > 0 else np.nan
+        return out
+else:
+    _tail_means_kernel = _tail_means_numpy
+
+
+def tail_means(values, offsets, window):
+    """
+    分段计算尾部窗口均值
+
+    多个标的的数据按行拼接为一个矩阵, 第i个标的占第offsets[i]至offsets[i+1]-1行
+
+    Args:
+        values: (行数, 列数) 拼接后的数值矩阵
+        offsets: 各段起始行号, 长度为段数+1, 末元素为总行数
+        window: 每段取最近window行
+
+    Returns:
+        np.ndarray: (段数, 列数) 忽略NaN的均值, 空段或全为NaN时为NaN
+    """
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+    out = np.empty((offsets.shape[0] - 1, values.shape[1]), dtype=np.float64)
+    return _tail_means_kernel(values, offsets, int(window), out)
+
+
+def build_hold_signal(buy, sell, shape):
+    """
+    合成持仓信号矩阵
+
+    规则与原pandas实现一致:
+    - 满足卖出条件置0(卖出优先)
+    - 满足买入条件置1
+    - 都不满足时保持上一交易日状态, 初始状态为0
+
+    Args:
+        buy: 买入条件布尔矩阵 (T, N), None表示全部满足
+        sell: 卖出条件布尔矩阵 (T, N), None表示全部不满足
+        shape: 矩阵形状 (T, N)
+
+    Returns:
+        np.ndarray: bool 信号矩阵, True表示持有(相比float64内存为1/8)
+
+    Raises:
+        ValueError: buy/sell的形状与shape不一致(内核不做越界检查)
+    """
+    shape = tuple(shape)
+    for name, cond in (('buy', buy), ('sell', sell)):
+        if cond is not None and tuple(cond.shape) != shape:
+            raise ValueError(f"{name}信号形状{tuple(cond.shape)}与目标形状{shape}不一致")
+
+    # 只有卖出条件: 买入恒满足, 持仓状态即"未触发卖出", 无需前向填充
+    if buy is None:
+        if sell is None:
+            return np.ones(shape, dtype=np.bool_)
+        return np.logical_not(sell)
+
+    # 只有买入条件: 一旦买入即一直持有, 等价于按列累计或
+    if sell is None:
+        return np.logical_or.accumulate(buy, axis=0)
+
+    # 按列扫描, 使用列优先(Fortran)布局保证内存连续访问
+    buy = np.asfortranarray(buy, dtype=np.bool_)
+    sell = np.asfortranarray(sell, dtype=np.bool_)
+
+    out = np.empty(shape, dtype=np.bool_, order='F')
+    return _build_hold_signal_kernel(buy, sell, out)
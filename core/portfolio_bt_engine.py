@@ -13,7 +13,8 @@ ETF组合回测引擎
 5. 计算高级绩效指标（Sortino、Calmar、VaR、胜率等）
 """
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional
+from typing import ClassVar, List, Dict, Optional
+import threading
 from datetime import datetime, timedelta
 import numpy as np
 import pandas as pd
@@ -23,6 +24,7 @@ from datafeed.db_dataloader import DbDataLoader
 from database.factor_cache import FactorCache
 from core.portfolio_tracker import PortfolioStateTracker
 from core.portfolio_metrics import PortfolioMetrics
+from core.numba_kernels import rolling_atr
 from core.portfolio_risk_controls import (
     CashRefillConfig,
     RiskMultiplierClipConfig,
@@ -85,6 +87,11 @@ class PortfolioTask:
 class PortfolioBacktestEngine:
     """ETF组合回测引擎"""
 
+    # 参数扫描时开启: 回测结果先写入缓冲区, 由flush_results一次批量入库
+    batch_save_results: ClassVar[bool] = False
+    _results_buffer: ClassVar[List[Dict]] = []
+    _results_lock: ClassVar[threading.Lock] = threading.Lock()
+
     def __init__(self, task: PortfolioTask):
         """
         初始化组合回测引擎
@@ -101,6 +108,8 @@ class PortfolioBacktestEngine:
         # ATR止损/止盈：记录每个持仓的入场价和入场时ATR
         self._entry_prices: Dict[str, float] = {}
         self._entry_atrs: Dict[str, float] = {}
+        # 按(标的, 周期)缓存整段ATR序列, 入场时按日期定位即可
+        self._atr_series: Dict[tuple, np.ndarray] = {}
 
         # 加载数据
         self._load_data()
@@ -122,14 +131,12 @@ class PortfolioBacktestEngine:
         )
 
         # 将日期设为索引（DbDataLoader返回的数据框没有日期索引）
+        # read_dfs每次返回新建的数据框, 直接原地转换, 不再逐个复制
         self.price_data = {}
         for symbol, df in raw_data.items():
             if 'date' in df.columns and not df.empty:
-                df_copy = df.copy()
-                df_copy['date'] = pd.to_datetime(df_copy['date'])
-                df_copy = df_copy.set_index('date')
-                df_copy = df_copy.sort_index()
-                self.price_data[symbol] = df_copy
+                df['date'] = pd.to_datetime(df['date'], format='%Y%m%d')
+                self.price_data[symbol] = df.set_index('date').sort_index()
             else:
                 self.price_data[symbol] = df
 
@@ -147,7 +154,11 @@ class PortfolioBacktestEngine:
         else:
             self.close_matrix = pd.DataFrame()
 
-        self.market_calendar = [ts.strftime('%Y-%m-%d') for ts in self.close_matrix.index] if not self.close_matrix.empty else []
+        self.market_calendar = list(self.close_matrix.index.strftime('%Y-%m-%d')) if not self.close_matrix.empty else []
+        # 逐日取价用: 收盘价矩阵的ndarray视图 + 日期到行号的映射
+        self._close_values = self.close_matrix.to_numpy(dtype=np.float64) if not self.close_matrix.empty else None
+        self._close_symbols = tuple(self.close_matrix.columns)
+        self._close_rows = {d: i for i, d in enumerate(self.market_calendar)}
         self.benchmark_series = pd.Series(dtype=float)
         self.benchmark_returns = pd.Series(dtype=float)
         if self.task.benchmark in self.price_data and 'close' in self.price_data[self.task.benchmark].columns:
@@ -180,8 +191,18 @@ class PortfolioBacktestEngine:
 
         # 逐日模拟
         previous_signals = None
+        previous_signal_id = None  # 前次信号对应的信号行编号, 相同则信号未变
         rebalance_count = 0
 
+        # 信号只依赖因子数据, 在逐日循环前一次性计算完
+        if trading_days:
+            self._prepare_signals()
+
+        # 基准日收益按日期字符串预先建表, 循环内不再逐日解析日期
+        benchmark_by_date = dict(zip(
+            self.benchmark_returns.index.strftime('%Y-%m-%d'), self.benchmark_returns.tolist()
+        )) if not self.benchmark_returns.empty else {}
+
         for i, date in enumerate(trading_days):
             if i % 50 == 0:
                 logger.info(f"处理进度: {i}/{len(trading_days)} ({i/len(trading_days)*100:.1f}%)")
@@ -194,26 +215,31 @@ class PortfolioBacktestEngine:
             if atr_force_sell:
                 for symbol in atr_force_sell:
                     trades = self._close_symbol_position(date, symbol, prices)
-                    for trade in trades:
-                        self.tracker.add_transaction(
-                            date=date, symbol=trade['symbol'],
-                            action=trade['action'], shares=trade['shares'],
-                            price=trade['price'], amount=trade['amount'],
-                            commission=trade.get('commission', 0.0),
-                            realized_pnl=trade.get('realized_pnl', 0.0),
-                        )
+                    self.tracker.add_transactions(date, trades)
                     self._entry_prices.pop(symbol, None)
                     self._entry_atrs.pop(symbol, None)
-                previous_signals = [s for s in (previous_signals or []) if s not in atr_force_sell]
+                previous_signals = (previous_signals or frozenset()).difference(atr_force_sell)
+                previous_signal_id = None  # 前次信号已被止损修改, 需按集合比较
 
             # 3. 使用信号生成器获取当前信号
-            current_signals = self._get_signals(date)
+            # 信号行编号与前次相同时信号必然未变, 跳过取列表和集合比较
+            signal_id = self._get_signal_id(date)
+            if signal_id == previous_signal_id:
+                rebalance = False
+            else:
+                current_signals = self._get_signals(date)
+                # 前次信号以frozenset保存, 每日只构建一次集合用于比较
+                current_set = frozenset(current_signals)
+                rebalance = self._should_rebalance(current_set, previous_signals)
+                if not rebalance:
+                    previous_signal_id = signal_id
 
             # 4. 检查信号是否变化（再平衡触发）
-            if self._should_rebalance(current_signals, previous_signals):
-                logger.debug(f"{date}: 信号变化，触发再平衡")
-                logger.debug(f"  当前标的: {current_signals}")
-                logger.debug(f"  前次标的: {previous_signals}")
+            if rebalance:
+                # 日志参数交给loguru, DEBUG被过滤时不格式化标的列表
+                logger.debug("{}: 信号变化，触发再平衡", date)
+                logger.debug("  当前标的: {}", current_signals)
+                logger.debug("  前次标的: {}", previous_signals)
 
                 # 4. 生成目标组合（等权）
                 if current_signals:
@@ -224,36 +250,17 @@ class PortfolioBacktestEngine:
                     trades = self._execute_rebalance(date, target_portfolio, prices)
 
                     # 记录交易历史
-                    for trade in trades:
-                        self.tracker.add_transaction(
-                            date=date,
-                            symbol=trade['symbol'],
-                            action=trade['action'],
-                            shares=trade['shares'],
-                            price=trade['price'],
-                            amount=trade['amount'],
-                            commission=trade.get('commission', 0.0),
-                            realized_pnl=trade.get('realized_pnl', 0.0),
-                        )
+                    self.tracker.add_transactions(date, trades)
 
                     rebalance_count += 1
                 else:
                     # 如果没有符合条件的标的，清空持仓
                     trades = self._close_all_positions(date, prices)
-                    logger.debug(f"{date}: 无符合条件的标的，清空持仓")
-                    for trade in trades:
-                        self.tracker.add_transaction(
-                            date=date,
-                            symbol=trade['symbol'],
-                            action=trade['action'],
-                            shares=trade['shares'],
-                            price=trade['price'],
-                            amount=trade['amount'],
-                            commission=trade.get('commission', 0.0),
-                            realized_pnl=trade.get('realized_pnl', 0.0),
-                        )
-
-                previous_signals = current_signals
+                    logger.debug("{}: 无符合条件的标的，清空持仓", date)
+                    self.tracker.add_transactions(date, trades)
+
+                previous_signals = current_set
+                previous_signal_id = signal_id
             else:
                 trades = []
 
@@ -261,11 +268,9 @@ class PortfolioBacktestEngine:
             self.tracker.update_daily_state(date, prices, trades)
             if self.tracker.daily_states:
                 self.portfolio_return_history.append(self.tracker.daily_states[-1].get('daily_return', 0.0))
-            if not self.benchmark_returns.empty:
-                dt = pd.to_datetime(date)
-                if dt in self.benchmark_returns.index:
-                    bench_ret = float(self.benchmark_returns.get(dt, 0.0))
-                    self.benchmark_return_history.append(bench_ret)
+            bench_ret = benchmark_by_date.get(date)
+            if bench_ret is not None:
+                self.benchmark_return_history.append(bench_ret)
 
         logger.info(f"回测完成，共再平衡 {rebalance_count} 次")
 
@@ -290,7 +295,7 @@ class PortfolioBacktestEngine:
         start = pd.to_datetime(self.task.start_date)
         end = pd.to_datetime(self.task.end_date)
         trading_days = self.close_matrix.index[(self.close_matrix.index >= start) & (self.close_matrix.index <= end)]
-        return [d.strftime('%Y-%m-%d') for d in trading_days]
+        return list(trading_days.strftime('%Y-%m-%d'))
 
     def _get_prices(self, date: str) -> Dict[str, float]:
         """
@@ -305,18 +310,19 @@ class PortfolioBacktestEngine:
         if self.close_matrix.empty:
             return {}
 
-        target_date = pd.to_datetime(date)
-        if target_date not in self.close_matrix.index:
-            available_dates = self.close_matrix.index[self.close_matrix.index <= target_date]
-            if len(available_dates) == 0:
+        pos = self._close_rows.get(date)
+        if pos is None:
+            # 非交易日取之前最近一个交易日
+            pos = int(self.close_matrix.index.searchsorted(pd.to_datetime(date), side='right')) - 1
+            if pos < 0:
                 return {}
-            target_date = available_dates.max()
 
-        row = self.close_matrix.loc[target_date]
+        row = self._close_values[pos]
+        valid = ~np.isnan(row)
         return {
-            symbol: float(price)
-            for symbol, price in row.items()
-            if symbol in self.task.symbols and pd.notna(price)
+            symbol: price
+            for symbol, price, ok in zip(self._close_symbols, row.tolist(), valid.tolist())
+            if ok
         }
 
     def _get_signals(self, date: str) -> List[str]:
@@ -329,72 +335,89 @@ class PortfolioBacktestEngine:
         Returns:
             符合条件的标的列表 ['510300.SH', '510500.SH', ...]
         """
-        # 延迟初始化因子缓存
-        if self.factor_cache is None:
-            all_factors = list(set(self.task.select_buy + self.task.select_sell))
-            self.factor_cache = FactorCache(
-                symbols=self.task.symbols,
-                start_date='20200101',  # 扩展起始日期以便计算因子
-                end_date=self.task.end_date
-            )
-            self.factor_cache.calculate_factors(all_factors)
-
-        buy_symbols = []
-
-        for symbol in self.task.symbols:
-            # 检查买入条件
-            buy_count = 0
-            for condition in self.task.select_buy:
-                try:
-                    df_factor = self.factor_cache.get_factor(condition)
-                    if df_factor is None:
-                        continue
-
-                    # 转换日期格式
-                    date_formatted = date.replace('-', '')
-
-                    if date_formatted in df_factor.index and symbol in df_factor.columns:
-                        value = df_factor.loc[date_formatted, symbol]
-                        if pd.notna(value) and value:
-                            buy_count += 1
-                except Exception as e:
-                    logger.debug(f"检查买入条件失败 {symbol} {condition}: {e}")
-                    continue
-
-            # 判断是否满足买入条件
-            threshold = self.task.buy_at_least_count if self.task.buy_at_least_count > 0 else len(self.task.select_buy)
-            if buy_count >= threshold:
-                # 检查卖出条件
-                sell_count = 0
-                for condition in self.task.select_sell:
-                    try:
-                        df_factor = self.factor_cache.get_factor(condition)
-                        if df_factor is None:
-                            continue
-
-                        date_formatted = date.replace('-', '')
-
-                        if date_formatted in df_factor.index and symbol in df_factor.columns:
-                            value = df_factor.loc[date_formatted, symbol]
-                            if pd.notna(value) and value:
-                                sell_count += 1
-                    except Exception as e:
-                        logger.debug(f"检查卖出条件失败 {symbol} {condition}: {e}")
-                        continue
-
-                # 如果不满足卖出条件，则买入
-                if sell_count < self.task.sell_at_least_count:
-                    buy_symbols.append(symbol)
-
-        return buy_symbols
-
-    def _should_rebalance(self, current_signals: List[str], previous_signals: Optional[List[str]]) -> bool:
+        self._prepare_signals()
+
+        row = self._signal_rows.get(date)
+        if row is None:
+            # 因子中没有该日期: 所有条件均视为不满足
+            return list(self._signal_without_data)
+        return list(self._signal_lists[self._signal_row_ids[row]])
+
+    def _get_signal_id(self, date: str) -> int:
+        """信号行编号: 编号相同的交易日信号完全相同, 因子中没有该日期时为-1"""
+        self._prepare_signals()
+        row = self._signal_rows.get(date)
+        return -1 if row is None else int(self._signal_row_ids[row])
+
+    def _prepare_signals(self):
+        """延迟初始化因子缓存, 并一次性计算全部交易日的信号"""
+        if self.factor_cache is not None:
+            return
+        all_factors = list(set(self.task.select_buy + self.task.select_sell))
+        self.factor_cache = FactorCache(
+            symbols=self.task.symbols,
+            start_date='20200101',  # 扩展起始日期以便计算因子
+            end_date=self.task.end_date
+        )
+        self.factor_cache.calculate_factors(all_factors)
+        self._build_signal_matrix()
+
+    def _count_conditions(self, conditions: List[str], index: pd.DatetimeIndex, kind: str) -> np.ndarray:
+        """
+        统计每个(交易日, 标的)满足的条件个数
+
+        因子值非空且非零视为满足; 因子缺失、日期或标的不在因子表中视为不满足
+
+        Returns:
+            np.ndarray, 形状 (交易日数, 标的数)
+        """
+        counts = np.zeros((len(index), len(self.task.symbols)), dtype=np.int32)
+        for condition in conditions:
+            df_factor = self.factor_cache.get_factor(condition)
+            if df_factor is None:
+                continue
+            try:
+                values = df_factor.reindex(index=index, columns=self.task.symbols).to_numpy(
+                    dtype=np.float64, na_value=np.nan
+                )
+            except Exception as e:
+                logger.debug(f"对齐{kind}条件失败 {condition}: {e}")
+                continue
+            counts += (values != 0) & ~np.isnan(values)
+        return counts
+
+    def _build_signal_matrix(self):
+        """
+        把买卖条件一次性对齐为 (交易日, 标的) 的布尔矩阵
+
+        逐日调用_get_signals时只需取一行, 不再逐标的、逐条件做.loc标量查找
+        """
+        index = self.close_matrix.index if not self.close_matrix.empty else pd.DatetimeIndex([])
+        threshold = self.task.buy_at_least_count if self.task.buy_at_least_count > 0 else len(self.task.select_buy)
+
+        buy_counts = self._count_conditions(self.task.select_buy, index, '买入')
+        sell_counts = self._count_conditions(self.task.select_sell, index, '卖出')
+
+        # 满足买入条件且不满足卖出条件
+        self._signal_matrix = (buy_counts >= threshold) & (sell_counts < self.task.sell_at_least_count)
+        self._signal_rows = {d: i for i, d in enumerate(self.market_calendar)}
+
+        # 按行内容去重: 信号通常连续多日不变, 相同的信号行只生成一次标的列表
+        symbols = self.task.symbols
+        unique_rows, row_ids = np.unique(self._signal_matrix, axis=0, return_inverse=True)
+        self._signal_row_ids = row_ids.ravel()
+        self._signal_lists = [tuple(symbols[i] for i in np.flatnonzero(r)) for r in unique_rows]
+
+        no_data = (0 >= threshold) and (0 < self.task.sell_at_least_count)
+        self._signal_without_data = tuple(symbols) if no_data else ()
+
+    def _should_rebalance(self, current_signals, previous_signals) -> bool:
         """
         信号变化时触发再平衡
 
         Args:
-            current_signals: 当前信号列表
-            previous_signals: 前一次信号列表
+            current_signals: 当前信号(列表或frozenset)
+            previous_signals: 前一次信号(列表或frozenset), None表示首次运行
 
         Returns:
             True 表示需要再平衡
@@ -402,7 +425,8 @@ class PortfolioBacktestEngine:
         if previous_signals is None:
             return True  # 首次运行
 
-        return set(current_signals) != set(previous_signals)
+        # frozenset(frozenset)不复制, 调用方传入frozenset时无额外分配
+        return frozenset(current_signals) != frozenset(previous_signals)
 
     def _generate_target_portfolio(self, symbols: List[str]) -> Dict[str, float]:
         """
@@ -425,8 +449,8 @@ class PortfolioBacktestEngine:
     def _get_recent_portfolio_returns(self, window: int) -> List[float]:
         if window <= 0:
             return []
-        returns = [state.get('daily_return', 0.0) for state in self.tracker.daily_states]
-        return returns[-window:]
+        # 直接截取按列存储的收益率序列, 避免每次再平衡都遍历状态字典
+        return self.tracker.get_state_column('daily_return')[-window:].tolist()
 
     def _get_current_drawdown(self) -> float:
         if not self.tracker.daily_states:
@@ -492,8 +516,8 @@ class PortfolioBacktestEngine:
 
         if risk_result.effective_multiplier != 1.0 or risk_result.cash_weight > 0:
             logger.debug(
-                f"{date}: 风控后权重 gross={risk_result.gross_weight:.3f}, "
-                f"cash={risk_result.cash_weight:.3f}, mult={risk_result.effective_multiplier:.3f}"
+                "{}: 风控后权重 gross={:.3f}, cash={:.3f}, mult={:.3f}",
+                date, risk_result.gross_weight, risk_result.cash_weight, risk_result.effective_multiplier
             )
 
         return adjusted
@@ -512,6 +536,8 @@ class PortfolioBacktestEngine:
         """
         trades = []
         portfolio_value = self.tracker.get_previous_value()
+        holdings = self.tracker.holdings
+        commission_rate = self.task.commission_rate
 
         # 1. 计算目标持仓数量
         target_shares = {}
@@ -525,33 +551,36 @@ class PortfolioBacktestEngine:
                 if shares > 0:
                     target_shares[symbol] = shares
 
-        # 2. 计算买卖差额
-        current_shares = {s: p['shares'] for s, p in self.tracker.holdings.items()}
-        all_symbols = set(current_shares.keys()) | set(target_shares.keys())
-
-        # 先卖后买，避免可成交调仓被“资金不足”误杀
-        for symbol in sorted(all_symbols):
+        # 2. 计算买卖差额(只排序一次, 买卖两轮共用)
+        current_shares = {s: p['shares'] for s, p in holdings.items()}
+        diffs = []
+        for symbol in sorted(current_shares.keys() | target_shares.keys()):
             current = current_shares.get(symbol, 0)
             target = target_shares.get(symbol, 0)
-            if target >= current:
+            if target != current:
+                diffs.append((symbol, current, target))
+
+        # 先卖后买，避免可成交调仓被“资金不足”误杀
+        for symbol, current, target in diffs:
+            if target > current:
                 continue
 
             sell_shares = current - target
             price = prices.get(symbol, 0)
-            if price <= 0 or sell_shares <= 0:
+            if price <= 0:
                 continue
 
             amount = sell_shares * price
-            commission = amount * self.task.commission_rate
+            commission = amount * commission_rate
             proceeds = amount - commission
-            avg_cost = self.tracker.holdings.get(symbol, {}).get('avg_cost', 0.0)
+            avg_cost = holdings[symbol].get('avg_cost', 0.0)
             realized_pnl = (price - avg_cost) * sell_shares
             new_shares = current - sell_shares
 
             if new_shares > 0:
                 self.tracker.update_position(symbol, new_shares, avg_cost)
-            elif symbol in self.tracker.holdings:
-                del self.tracker.holdings[symbol]
+            else:
+                del holdings[symbol]
 
             self.tracker.cash += proceeds
 
@@ -565,10 +594,8 @@ class PortfolioBacktestEngine:
                 'realized_pnl': realized_pnl,
             })
 
-        for symbol in sorted(all_symbols):
-            current = current_shares.get(symbol, 0)
-            target = target_shares.get(symbol, 0)
-            if target <= current:
+        for symbol, current, target in diffs:
+            if target < current:
                 continue
 
             buy_shares = target - current
@@ -577,18 +604,17 @@ class PortfolioBacktestEngine:
                 continue
 
             amount = buy_shares * price
-            commission = amount * self.task.commission_rate
+            commission = amount * commission_rate
             cost = amount + commission
 
             if self.tracker.cash < cost:
-                logger.debug(f"{date}: 资金不足，无法买入 {symbol} {buy_shares}股")
+                logger.debug("{}: 资金不足，无法买入 {} {}股", date, symbol, buy_shares)
                 continue
 
-            old_shares = current
-            old_cost = self.tracker.holdings.get(symbol, {}).get('shares', 0) * \
-                       self.tracker.holdings.get(symbol, {}).get('avg_cost', 0)
+            position = holdings.get(symbol)
+            old_cost = position.get('shares', 0) * position.get('avg_cost', 0) if position else 0
             new_cost = old_cost + amount
-            new_shares = old_shares + buy_shares
+            new_shares = current + buy_shares
 
             self.tracker.update_position(symbol, new_shares, new_cost / new_shares if new_shares > 0 else 0)
             self.tracker.cash -= cost
@@ -616,17 +642,24 @@ class PortfolioBacktestEngine:
         df = self.price_data.get(symbol)
         if df is None or len(df) < period + 1:
             return None
-        target = pd.to_datetime(date)
-        hist = df[df.index <= target].tail(period + 1)
-        if len(hist) < period + 1 or 'high' not in hist.columns or 'low' not in hist.columns:
+        if 'high' not in df.columns or 'low' not in df.columns:
             return None
-        tr = pd.concat([
-            hist['high'] - hist['low'],
-            (hist['high'] - hist['close'].shift(1)).abs(),
-            (hist['low'] - hist['close'].shift(1)).abs()
-        ], axis=1).max(axis=1)
-        atr = tr.rolling(period).mean().iloc[-1]
-        return float(atr) if not pd.isna(atr) else None
+        key = (symbol, period)
+        atr_values = self._atr_series.get(key)
+        if atr_values is None:
+            atr_values = rolling_atr(
+                df['high'].to_numpy(dtype=np.float64, na_value=np.nan),
+                df['low'].to_numpy(dtype=np.float64, na_value=np.nan),
+                df['close'].to_numpy(dtype=np.float64, na_value=np.nan),
+                period,
+            )
+            self._atr_series[key] = atr_values
+        # 最后一个不晚于date的交易日, 之前不足period+1根K线时无法计算
+        pos = int(df.index.searchsorted(pd.Timestamp(date), side='right')) - 1
+        if pos < period:
+            return None
+        atr = atr_values[pos]
+        return float(atr) if not np.isnan(atr) else None
 
     def _check_atr_stops(self, date: str, prices: Dict[str, float]) -> List[str]:
         """检查ATR止损/止盈，返回需要强制平仓的标的列表"""
@@ -640,10 +673,12 @@ class PortfolioBacktestEngine:
             if price <= 0 or entry_price <= 0 or entry_atr <= 0:
                 continue
             if self.task.atr_stop_multiplier and price < entry_price - entry_atr * self.task.atr_stop_multiplier:
-                logger.debug(f"{date}: {symbol} ATR止损触发 price={price:.3f} < {entry_price - entry_atr * self.task.atr_stop_multiplier:.3f}")
+                logger.debug("{}: {} ATR止损触发 price={:.3f} < {:.3f}",
+                             date, symbol, price, entry_price - entry_atr * self.task.atr_stop_multiplier)
                 force_sell.append(symbol)
             elif self.task.atr_tp_multiplier and price > entry_price + entry_atr * self.task.atr_tp_multiplier:
-                logger.debug(f"{date}: {symbol} ATR止盈触发 price={price:.3f} > {entry_price + entry_atr * self.task.atr_tp_multiplier:.3f}")
+                logger.debug("{}: {} ATR止盈触发 price={:.3f} > {:.3f}",
+                             date, symbol, price, entry_price + entry_atr * self.task.atr_tp_multiplier)
                 force_sell.append(symbol)
         return force_sell
 
@@ -779,7 +814,7 @@ class PortfolioBacktestEngine:
             'avg_turnover_rate': all_metrics['avg_turnover_rate'],
             'total_trades': len(self.tracker.transaction_history),
             'equity_curve': metrics_calculator.get_equity_curve(),
-            'final_holdings': final_state['holdings'],
+            'final_holdings': self.tracker.snapshot(),
             'daily_df': daily_df.to_dict('records') if not daily_df.empty else [],
         }
 
@@ -802,11 +837,6 @@ class PortfolioBacktestEngine:
         """
         try:
             from database.models.models import StrategyBacktest
-            from database.pg_manager import get_db
-            from sqlalchemy import create_engine
-            from sqlalchemy.orm import sessionmaker
-
-            db = get_db()
 
             # 准备数据
             portfolio_config = {
@@ -823,8 +853,8 @@ class PortfolioBacktestEngine:
                 'risk_off_multiplier': self.task.risk_off_multiplier,
             }
 
-            # 创建回测记录
-            backtest = StrategyBacktest(
+            # 回测记录字段
+            record = dict(
                 strategy_name=self.task.name,
                 asset_type='etf',
                 start_date=datetime.strptime(self.task.start_date, '%Y%m%d').date(),
@@ -861,8 +891,15 @@ class PortfolioBacktestEngine:
                 status='completed'
             )
 
+            if type(self).batch_save_results:
+                with PortfolioBacktestEngine._results_lock:
+                    PortfolioBacktestEngine._results_buffer.append(record)
+                logger.debug("回测结果已加入批量入库缓冲区: {}", self.task.name)
+                return
+
             # 保存到数据库
-            with db.get_session() as session:
+            backtest = StrategyBacktest(**record)
+            with get_db().get_session() as session:
                 session.add(backtest)
                 session.commit()
                 logger.info(f"✓ 保存回测结果到数据库: ID={backtest.id}")
@@ -872,6 +909,37 @@ class PortfolioBacktestEngine:
             import traceback
             traceback.print_exc()
 
+    @classmethod
+    def flush_results(cls, db=None) -> int:
+        """
+        将缓冲区中的回测结果一次性批量写入数据库
+
+        Args:
+            db: 数据库管理器, 默认使用get_db()
+
+        Returns:
+            写入的记录数
+        """
+        with PortfolioBacktestEngine._results_lock:
+            rows = list(PortfolioBacktestEngine._results_buffer)
+            PortfolioBacktestEngine._results_buffer.clear()
+        if not rows:
+            return 0
+
+        from database.models.models import StrategyBacktest
+
+        try:
+            with (db or get_db()).get_session() as session:
+                session.bulk_insert_mappings(StrategyBacktest, rows)
+            logger.info(f"✓ 批量保存回测结果到数据库: {len(rows)} 条")
+            return len(rows)
+        except Exception as e:
+            # 写入失败时放回缓冲区, 便于重试
+            with PortfolioBacktestEngine._results_lock:
+                PortfolioBacktestEngine._results_buffer[:0] = rows
+            logger.error(f"批量保存回测结果失败: {e}")
+            return 0
+
 
 # 便捷函数
 def run_portfolio_backtest(
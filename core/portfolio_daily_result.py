@@ -25,6 +25,16 @@ def normalize_trade_date(value: Any) -> str:
         if not value:
             raise ValueError("date is required")
 
+        # Backtest loops pass canonical `YYYY-MM-DD` strings every day; validate
+        # them with `date.fromisoformat` and return as-is instead of a
+        # strptime/strftime round trip.
+        if len(value) == 10 and value[4] == "-" and value[7] == "-":
+            try:
+                date.fromisoformat(value)
+                return value
+            except ValueError:
+                pass
+
         for fmt in ("%Y-%m-%d", "%Y%m%d", "%Y/%m/%d"):
             try:
                 return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
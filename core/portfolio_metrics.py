@@ -10,11 +10,20 @@
 - 胜率（日/周/月）
 - 信息比率（相对基准）
 """
+import math
+import warnings
+
 import numpy as np
 import pandas as pd
 from typing import Dict, List, Optional
 from loguru import logger
 
+from core.numba_kernels import excess_return_stats, return_stats
+
+# 年化常量（日频序列）
+TRADING_DAYS = 252
+ANNUALIZATION_FACTOR = math.sqrt(TRADING_DAYS)
+
 
 class PortfolioMetrics:
     """组合绩效指标计算器"""
@@ -30,7 +39,9 @@ class PortfolioMetrics:
         self.daily_states = daily_states
         self.risk_free_rate = risk_free_rate
         self.daily_df = self._to_daily_df(daily_states)
-        self.returns = self._extract_returns()
+        self._extract_arrays()
+        # 输入在构造后不再变化, 年化收益/VaR/月度收益等子结果计算一次后复用
+        self._cache: Dict = {}
 
     def _to_daily_df(self, daily_states) -> pd.DataFrame:
         """将输入规范化为逐日结果 DataFrame。"""
@@ -63,25 +74,40 @@ class PortfolioMetrics:
             df['cumulative_return'] = df['equity'] / initial - 1.0
 
         if 'running_max_drawdown' not in df.columns and 'equity' in df.columns:
-            running_max = df['equity'].cummax().replace(0, np.nan)
-            df['running_max_drawdown'] = (df['equity'] - running_max) / running_max
-            df['running_max_drawdown'] = df['running_max_drawdown'].fillna(0.0)
+            # 追踪器已提供回撤序列时直接复用; 否则由净值一次累计求峰值(fmax忽略NaN, 与cummax一致)
+            equity = df['equity'].to_numpy(dtype=float, na_value=np.nan)
+            peaks = np.fmax.accumulate(equity)
+            peaks[peaks == 0] = np.nan
+            with np.errstate(invalid='ignore'):
+                drawdown = (equity - peaks) / peaks
+            df['running_max_drawdown'] = np.nan_to_num(drawdown, nan=0.0)
 
         if 'turnover_rate' not in df.columns:
             df['turnover_rate'] = 0.0
 
         return df
 
-    def _extract_returns(self) -> np.ndarray:
+    def _extract_arrays(self):
         """
-        提取每日收益率
+        从逐日结果中一次性提取各指标所需的数组, 各计算方法直接复用
 
-        Returns:
-            每日收益率数组
+        - returns: 每日收益率
+        - running_dd: 累计最大回撤
+        - turnover: 换手率
+        - dates: 日期
         """
-        if self.daily_df.empty:
-            return np.array([])
-        return self.daily_df['daily_return'].fillna(0.0).to_numpy(dtype=float)
+        df = self.daily_df
+        if df.empty:
+            self.returns = np.array([])
+            self.running_dd = np.array([])
+            self.turnover = np.array([])
+            self.dates = pd.DatetimeIndex([])
+            return
+
+        self.returns = df['daily_return'].fillna(0.0).to_numpy(dtype=float)
+        self.running_dd = df['running_max_drawdown'].to_numpy(dtype=float, na_value=np.nan)
+        self.turnover = df['turnover_rate'].fillna(0.0).to_numpy(dtype=float)
+        self.dates = pd.DatetimeIndex(df['date']) if 'date' in df.columns else pd.DatetimeIndex([])
 
     def calculate_sortino_ratio(self) -> float:
         """
@@ -99,8 +125,8 @@ class PortfolioMetrics:
         annual_return = self._calculate_annual_return()
 
         # 下行波动率（只考虑负收益）
-        downside_returns = self.returns[self.returns < 0]
-        downside_std = downside_returns.std() * np.sqrt(252) if len(downside_returns) > 0 else 0
+        _, _, downside_std, n_down = self._return_stats()
+        downside_std = downside_std * ANNUALIZATION_FACTOR if n_down > 0 else 0
 
         if downside_std == 0:
             return 0.0
@@ -108,6 +134,12 @@ class PortfolioMetrics:
         sortino = (annual_return - self.risk_free_rate) / downside_std
         return sortino
 
+    def _return_stats(self):
+        """收益率均值/标准差/下行标准差, 一次遍历计算并缓存"""
+        if 'return_stats' not in self._cache:
+            self._cache['return_stats'] = return_stats(self.returns)
+        return self._cache['return_stats']
+
     def calculate_calmar_ratio(self) -> float:
         """
         计算Calmar比率
@@ -124,7 +156,7 @@ class PortfolioMetrics:
         annual_return = self._calculate_annual_return()
 
         # 最大回撤
-        max_dd = float(self.daily_df['running_max_drawdown'].min())
+        max_dd = float(np.nanmin(self.running_dd))
 
         if max_dd == 0:
             return 0.0
@@ -144,12 +176,7 @@ class PortfolioMetrics:
         Returns:
             VaR值（负数表示损失）
         """
-        if len(self.returns) == 0:
-            return 0.0
-
-        # 计算分位数
-        var = np.percentile(self.returns, (1 - confidence) * 100)
-        return var
+        return self._var_cvar(confidence)[0]
 
     def calculate_cvar(self, confidence: float = 0.95) -> float:
         """
@@ -163,19 +190,37 @@ class PortfolioMetrics:
         Returns:
             CVaR值（负数表示损失）
         """
+        return self._var_cvar(confidence)[1]
+
+    def _var_cvar(self, confidence: float):
+        """
+        同时计算VaR和CVaR, 分位数只求一次, 同一置信水平的结果缓存复用
+
+        np.percentile内部基于partition选取分位点(无需全排序), 线性插值口径保持不变
+
+        Returns:
+            (VaR, CVaR)
+        """
+        key = ('var_cvar', confidence)
+        if key not in self._cache:
+            self._cache[key] = self._compute_var_cvar(confidence)
+        return self._cache[key]
+
+    def _compute_var_cvar(self, confidence: float):
         if len(self.returns) == 0:
-            return 0.0
+            return 0.0, 0.0
 
-        var = self.calculate_var(confidence)
+        # 计算分位数
+        var = np.percentile(self.returns, (1 - confidence) * 100)
 
         # 计算小于等于VaR的收益率的平均值
-        cvar = self.returns[self.returns <= var].mean()
-
-        # 如果没有超过VaR的值，返回VaR
-        if np.isnan(cvar):
-            return var
+        tail = self.returns[self.returns <= var]
 
-        return cvar
+        # 如果没有超过VaR的值，CVaR取VaR
+        if len(tail) == 0:
+            return var, var
+        cvar = tail.mean()
+        return var, (var if np.isnan(cvar) else cvar)
 
     def calculate_monthly_returns(self) -> Dict[str, float]:
         """
@@ -184,14 +229,21 @@ class PortfolioMetrics:
         Returns:
             月度收益字典 {'2024-01': 0.05, '2024-02': -0.03, ...}
         """
+        if 'monthly_returns' not in self._cache:
+            self._cache['monthly_returns'] = self._compute_monthly_returns()
+        # 返回副本, 调用方修改不影响缓存
+        return dict(self._cache['monthly_returns'])
+
+    def _compute_monthly_returns(self) -> Dict[str, float]:
         if self.daily_df.empty:
             return {}
-        df = self.daily_df[['date', 'daily_return']].copy()
-        df['month'] = df['date'].dt.strftime('%Y-%m')
-        monthly_cumulative = {}
-        for month, group in df.groupby('month'):
-            monthly_cumulative[month] = (group['daily_return'].to_numpy(dtype=float) + 1).prod() - 1
-        return monthly_cumulative
+        # 按月分段连乘: daily_df已按日期排序, 同月数据连续, 日期在初始化时已解析为DatetimeIndex
+        # 使用未填充的原始日收益, 当月有缺失收益(NaN)时该月收益为NaN(不按0处理)
+        months = self.dates.to_period('M')
+        starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+        raw_returns = self.daily_df['daily_return'].to_numpy(dtype=float, na_value=np.nan)
+        monthly = np.multiply.reduceat(raw_returns + 1, starts) - 1
+        return dict(zip(months[starts].strftime('%Y-%m'), monthly))
 
     def calculate_win_rate(self) -> Dict[str, float]:
         """
@@ -206,17 +258,9 @@ class PortfolioMetrics:
         # 日胜率
         daily_win_rate = (self.returns > 0).sum() / len(self.returns) * 100
 
-        # 周胜率（聚合周收益）
-        weekly_returns = []
-        for i in range(0, len(self.returns), 5):
-            week_returns = self.returns[i:i+5]
-            if len(week_returns) > 0:
-                weekly_returns.append((week_returns + 1).prod() - 1)
-
-        if weekly_returns:
-            weekly_win_rate = (np.array(weekly_returns) > 0).sum() / len(weekly_returns) * 100
-        else:
-            weekly_win_rate = 0.0
+        # 周胜率（每5个交易日聚合周收益, 末尾不足5日的部分单独成周）
+        weekly_returns = np.multiply.reduceat(self.returns + 1, np.arange(0, len(self.returns), 5)) - 1
+        weekly_win_rate = (weekly_returns > 0).sum() / len(weekly_returns) * 100
 
         # 月胜率
         monthly_returns_dict = self.calculate_monthly_returns()
@@ -244,17 +288,17 @@ class PortfolioMetrics:
         if len(self.returns) == 0 or len(benchmark_returns) != len(self.returns):
             return 0.0
 
-        # 超额收益
-        excess_returns = self.returns - benchmark_returns
+        # 超额收益的均值和标准差（单次遍历, 不生成超额收益数组）
+        excess_mean, excess_std = excess_return_stats(self.returns, benchmark_returns)
 
         # 跟踪误差（超额收益的标准差）
-        tracking_error = excess_returns.std() * np.sqrt(252)
+        tracking_error = excess_std * ANNUALIZATION_FACTOR
 
         if tracking_error == 0:
             return 0.0
 
         # 信息比率（年化超额收益 / 跟踪误差）
-        ir = excess_returns.mean() * 252 / tracking_error
+        ir = excess_mean * TRADING_DAYS / tracking_error
         return ir
 
     def _calculate_annual_return(self) -> float:
@@ -264,13 +308,18 @@ class PortfolioMetrics:
         Returns:
             年化收益率
         """
+        if 'annual_return' not in self._cache:
+            self._cache['annual_return'] = self._compute_annual_return()
+        return self._cache['annual_return']
+
+    def _compute_annual_return(self) -> float:
         if self.daily_df.empty:
             return 0.0
-        total_return = float(self.daily_df['cumulative_return'].iloc[-1])
-        days = len(self.daily_df)
+        total_return = float(self.daily_df['cumulative_return'].iat[-1])
+        days = len(self.returns)
 
-        # 年化收益: (1 + total_return) ^ (252 / days) - 1
-        annual_return = (1 + total_return) ** (252 / days) - 1 if days > 0 else 0
+        # 年化收益: (1 + total_return) ^ (252 / days) - 1, 用log1p/expm1计算, 小收益时避免相消误差
+        annual_return = float(np.expm1(np.log1p(total_return) * TRADING_DAYS / days)) if days > 0 else 0
 
         return annual_return
 
@@ -287,19 +336,18 @@ class PortfolioMetrics:
         annual_return = self._calculate_annual_return()
 
         # 计算波动率
-        volatility = self.returns.std() * np.sqrt(252) if len(self.returns) > 0 else 0
+        volatility = self._return_stats()[1] * ANNUALIZATION_FACTOR if len(self.returns) > 0 else 0
 
         # 计算夏普比率
         sharpe_ratio = (annual_return - self.risk_free_rate) / volatility if volatility > 0 else 0
 
         # 最大回撤
-        max_drawdown = float(self.daily_df['running_max_drawdown'].min())
+        max_drawdown = float(np.nanmin(self.running_dd))
 
         # 高级指标
         sortino_ratio = self.calculate_sortino_ratio()
         calmar_ratio = self.calculate_calmar_ratio()
-        var_95 = self.calculate_var(0.95)
-        cvar_95 = self.calculate_cvar(0.95)
+        var_95, cvar_95 = self._var_cvar(0.95)
 
         # 胜率
         win_rates = self.calculate_win_rate()
@@ -308,7 +356,7 @@ class PortfolioMetrics:
         monthly_returns = self.calculate_monthly_returns()
 
         # 平均换手率
-        avg_turnover_rate = float(self.daily_df['turnover_rate'].fillna(0.0).mean())
+        avg_turnover_rate = float(self.turnover.mean())
 
         return {
             'annual_return': annual_return,
@@ -324,6 +372,81 @@ class PortfolioMetrics:
             'avg_turnover_rate': avg_turnover_rate
         }
 
+    @classmethod
+    def batch_calculate(cls, returns_list: List[np.ndarray], risk_free_rate: float = 0.03,
+                        names: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        批量计算多组日收益率序列的核心指标（参数扫描等场景）
+
+        各序列按行补齐为NaN填充的二维矩阵, 每个指标沿axis=1一次向量化计算,
+        口径与单实例calculate_all_metrics一致（净值从首日收益后开始计算回撤）
+
+        注意: 单实例的daily_return由净值pct_change得到, 首日收益为0, 总收益按equity/equity[0]计算;
+        这里总收益是全部收益的累乘, 因此只有各序列首日收益为0时两者一致。
+        首日收益非0时, 这里会把首日收益计入总收益和回撤, 单实例则不会
+
+        Args:
+            returns_list: 日收益率序列列表, 长度可以不同
+            risk_free_rate: 无风险利率，默认3%
+            names: 各序列名称, 作为结果索引, 默认按序号
+
+        Returns:
+            DataFrame: 每行一个序列, 列为annual_return/volatility/sharpe_ratio/sortino_ratio/
+                       calmar_ratio/max_drawdown/var_95/cvar_95
+        """
+        columns = ['annual_return', 'volatility', 'sharpe_ratio', 'sortino_ratio',
+                   'calmar_ratio', 'max_drawdown', 'var_95', 'cvar_95']
+        index = list(names) if names is not None else list(range(len(returns_list)))
+        if not returns_list:
+            return pd.DataFrame(columns=columns, index=index, dtype=float)
+
+        lengths = np.array([len(r) for r in returns_list])
+        matrix = np.full((len(returns_list), max(int(lengths.max()), 1)), np.nan)
+        for i, returns in enumerate(returns_list):
+            # 与单实例一致: 缺失收益按0处理
+            matrix[i, :len(returns)] = np.nan_to_num(np.asarray(returns, dtype=float), nan=0.0)
+        has_data = lengths > 0
+
+        with np.errstate(all='ignore'), warnings.catch_warnings():
+            # 空序列整行为NaN, 相关警告忽略, 结果在最后统一置0
+            warnings.simplefilter('ignore', RuntimeWarning)
+
+            # 年化收益
+            total_return = np.nanprod(matrix + 1, axis=1) - 1
+            annual_return = np.where(has_data, np.expm1(np.log1p(total_return) * TRADING_DAYS / np.maximum(lengths, 1)), 0.0)
+
+            # 波动率 / 夏普比率
+            volatility = np.nanstd(matrix, axis=1) * ANNUALIZATION_FACTOR
+            sharpe_ratio = np.where(volatility > 0, (annual_return - risk_free_rate) / volatility, 0.0)
+
+            # 下行波动率 / Sortino比率（无负收益时为0）
+            downside_std = np.nan_to_num(np.nanstd(np.where(matrix < 0, matrix, np.nan), axis=1), nan=0.0) * ANNUALIZATION_FACTOR
+            sortino_ratio = np.where(downside_std > 0, (annual_return - risk_free_rate) / downside_std, 0.0)
+
+            # 最大回撤 / Calmar比率（补齐部分的NaN在累乘中视为1, 不影响结果）
+            equity = np.nancumprod(matrix + 1, axis=1)
+            drawdown = equity / np.maximum.accumulate(equity, axis=1) - 1
+            max_drawdown = np.where(has_data, np.nanmin(drawdown, axis=1), 0.0)
+            calmar_ratio = np.where(max_drawdown != 0, annual_return / np.abs(max_drawdown), 0.0)
+
+            # VaR / CVaR
+            var_95 = np.nanpercentile(matrix, 5, axis=1)
+            cvar_95 = np.nanmean(np.where(matrix <= var_95[:, None], matrix, np.nan), axis=1)
+            cvar_95 = np.where(np.isnan(cvar_95), var_95, cvar_95)
+
+        result = pd.DataFrame({
+            'annual_return': annual_return,
+            'volatility': volatility,
+            'sharpe_ratio': sharpe_ratio,
+            'sortino_ratio': sortino_ratio,
+            'calmar_ratio': calmar_ratio,
+            'max_drawdown': max_drawdown,
+            'var_95': var_95,
+            'cvar_95': cvar_95,
+        }, index=index)
+        result.loc[~has_data, :] = 0.0
+        return result
+
     def get_equity_curve(self) -> List[Dict]:
         """
         获取净值曲线
@@ -385,16 +508,42 @@ class PortfolioMetrics:
             'kurtosis': float(self._calculate_kurtosis())
         }
 
+    def _central_moments(self):
+        """
+        收益率的均值及二/三/四阶中心矩, 去均值数组只计算一次并缓存
+
+        口径与scipy.stats.skew/kurtosis(bias=True)一致, 无需导入scipy
+        """
+        if 'central_moments' not in self._cache:
+            mean = self.returns.mean()
+            deviation = self.returns - mean
+            squared = deviation * deviation
+            self._cache['central_moments'] = (
+                mean,
+                squared.mean(),
+                (squared * deviation).mean(),
+                (squared * squared).mean(),
+            )
+        return self._cache['central_moments']
+
+    def _is_constant(self, mean: float, m2: float) -> bool:
+        """二阶矩在浮点精度内为0(收益率恒定)时, 偏度和峰度无定义"""
+        return m2 <= (np.finfo(float).eps * mean) ** 2
+
     def _calculate_skewness(self) -> float:
         """计算偏度"""
-        from scipy import stats
         if len(self.returns) < 3:
             return 0.0
-        return stats.skew(self.returns)
+        mean, m2, m3, _ = self._central_moments()
+        if self._is_constant(mean, m2):
+            return np.nan
+        return m3 / m2 ** 1.5
 
     def _calculate_kurtosis(self) -> float:
-        """计算峰度"""
-        from scipy import stats
+        """计算峰度（超额峰度, 正态分布为0）"""
         if len(self.returns) < 4:
             return 0.0
-        return stats.kurtosis(self.returns)
+        mean, m2, _, m4 = self._central_moments()
+        if self._is_constant(mean, m2):
+            return np.nan
+        return m4 / m2 ** 2.0 - 3
@@ -11,35 +11,89 @@
 - 交易历史
 """
 import numpy as np
+from bisect import bisect_right
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from loguru import logger
 
 from core.portfolio_daily_result import PortfolioDailyLedger
+
+# 按列存储的每日状态数值字段
+STATE_COLUMNS = (
+    'portfolio_value',
+    'daily_return',
+    'cumulative_return',
+    'running_max_drawdown',
+    'turnover_rate',
+    'cash',
+    'position_count',
+)
 
 
 class PortfolioStateTracker:
     """组合状态追踪器"""
 
-    def __init__(self, initial_capital: float = 1000000):
+    def __init__(self, initial_capital: float = 1000000, detailed: bool = False):
         """
         初始化组合状态追踪器
 
         Args:
             initial_capital: 初始资金，默认100万
+            detailed: 是否在每日状态中记录持仓明细列表(holdings), 默认关闭;
+                      关闭时每日持仓仍写入daily_ledger, 当前持仓明细通过snapshot()获取
         """
         self.initial_capital = initial_capital
+        self.detailed = detailed
         self.cash = initial_capital  # 当前现金
         self.holdings = {}  # 当前持仓 {symbol: {'shares': int, 'avg_cost': float}}
         self.daily_states = []  # 每日状态记录
         self.transaction_history = []  # 交易历史 [{'date', 'symbol', 'action', 'shares', 'price', 'amount'}]
         self.daily_ledger = PortfolioDailyLedger()
+        # 回撤统计增量维护: 历史最高净值与运行最大回撤
+        self._running_peak = initial_capital
+        self._running_max_dd = 0.0
+        # 换手率计算用的交易索引: 与transaction_history平行的日期序数/方向/金额, 按日期有序追加
+        self._trade_ordinals: List[int] = []
+        self._trade_actions: List[str] = []
+        self._trade_amounts: List[float] = []
+        self._init_state_columns()
+        # 前一日组合市值及持仓快照, 每日更新状态后刷新
+        self._last_value = initial_capital
+        self._last_holdings_snapshot: Dict[str, Dict] = {}
+
+    def _init_state_columns(self, capacity: int = 256):
+        """初始化按列存储的每日状态数组, 容量不足时倍增"""
+        self._state_columns = {name: np.empty(capacity, dtype=np.float64) for name in STATE_COLUMNS}
+        self._state_count = 0
+
+    def _append_state_columns(self, state: Dict):
+        """将当日状态的数值字段写入列数组"""
+        n = self._state_count
+        columns = self._state_columns
+        if n == len(columns['portfolio_value']):
+            for name, values in columns.items():
+                grown = np.empty(n * 2, dtype=np.float64)
+                grown[:n] = values
+                columns[name] = grown
+        for name, values in columns.items():
+            values[n] = state[name]
+        self._state_count = n + 1
+
+    def get_state_column(self, name: str) -> np.ndarray:
+        """
+        获取每日状态某一数值字段的序列（只读视图, 与daily_states一一对应）
+
+        Args:
+            name: 字段名, 见STATE_COLUMNS
+
+        Returns:
+            float64数组
+        """
+        return self._state_columns[name][:self._state_count]
 
     def get_previous_value(self) -> float:
         """获取前一日的组合市值"""
-        if self.daily_states:
-            return self.daily_states[-1]['portfolio_value']
-        return self.initial_capital
+        return self._last_value
 
     def update_daily_state(self, date: str, prices: Dict[str, float], trades: List[Dict]):
         """
@@ -55,7 +109,6 @@ class PortfolioStateTracker:
         """
         # 1. 计算持仓市值
         portfolio_value = self.cash
-        holdings_detail = []
         holdings_snapshot = {}
 
         for symbol, position in self.holdings.items():
@@ -66,23 +119,15 @@ class PortfolioStateTracker:
                 market_value = shares * price
                 portfolio_value += market_value
 
-                snapshot = {
-                    'symbol': symbol,
-                    'shares': shares,
-                    'avg_cost': position['avg_cost'],
-                    'price': price,
-                    'market_value': market_value,
-                }
                 holdings_snapshot[symbol] = {
                     'shares': shares,
                     'avg_cost': position['avg_cost'],
                     'price': price,
                     'market_value': market_value,
                 }
-                holdings_detail.append(snapshot)
 
-        for detail in holdings_detail:
-            detail['weight'] = detail['market_value'] / portfolio_value if portfolio_value > 0 else 0
+        # 持仓明细(含权重)仅在detailed模式下逐日构建
+        holdings_detail = self._build_holdings_detail(holdings_snapshot, portfolio_value) if self.detailed else []
 
         # 2. 计算收益率
         previous_value = self.get_previous_value()
@@ -139,9 +184,36 @@ class PortfolioStateTracker:
         }
 
         self.daily_states.append(state)
+        self._append_state_columns(state)
+        self._last_value = portfolio_value
+        self._last_holdings_snapshot = holdings_snapshot
 
         return state
 
+    @staticmethod
+    def _build_holdings_detail(holdings_snapshot: Dict[str, Dict], portfolio_value: float) -> List[Dict]:
+        """由持仓快照构建持仓明细列表, 附带权重"""
+        return [
+            {
+                'symbol': symbol,
+                'shares': item['shares'],
+                'avg_cost': item['avg_cost'],
+                'price': item['price'],
+                'market_value': item['market_value'],
+                'weight': item['market_value'] / portfolio_value if portfolio_value > 0 else 0,
+            }
+            for symbol, item in holdings_snapshot.items()
+        ]
+
+    def snapshot(self) -> List[Dict]:
+        """
+        获取最近一次update_daily_state时的持仓明细
+
+        Returns:
+            持仓明细列表 [{'symbol', 'shares', 'avg_cost', 'price', 'market_value', 'weight'}]
+        """
+        return self._build_holdings_detail(self._last_holdings_snapshot, self._last_value)
+
     def _calculate_max_drawdown(self, current_value: float) -> Dict:
         """
         计算最大回撤
@@ -153,20 +225,21 @@ class PortfolioStateTracker:
             {'daily': 当日回撤, 'running': 运行最大回撤}
         """
         if not self.daily_states:
+            # 首日: 以当日净值作为历史最高点起点
+            self._running_peak = current_value
+            self._running_max_dd = 0.0
             return {'daily': 0.0, 'running': 0.0}
 
-        # 获取所有历史净值
-        all_values = [s['portfolio_value'] for s in self.daily_states] + [current_value]
-
-        # 计算历史最高点
-        peak = max(all_values)
+        # 历史最高点（增量更新, 不再遍历全部历史状态）
+        peak = max(self._running_peak, current_value)
+        self._running_peak = peak
 
         # 当日回撤
         daily_drawdown = (current_value - peak) / peak if peak > 0 else 0
 
         # 运行最大回撤
-        running_max_dd = min(s['running_max_drawdown'] for s in self.daily_states)
-        running_max_dd = min(running_max_dd, daily_drawdown)
+        running_max_dd = min(self._running_max_dd, daily_drawdown)
+        self._running_max_dd = running_max_dd
 
         return {
             'daily': daily_drawdown,
@@ -185,46 +258,24 @@ class PortfolioStateTracker:
         Returns:
             换手率（0-1之间的小数）
         """
-        if not self.transaction_history:
+        ordinals = self._trade_ordinals
+        if not self.transaction_history or not ordinals:
             return 0.0
 
-        # 获取最近的交易日期
-        last_trade_date = None
-        if self.transaction_history:
-            last_trade_date = self.transaction_history[-1]['date']
-
-        if last_trade_date is None:
-            return 0.0
-
-        # 筛选最近N天的交易
-        if isinstance(last_trade_date, str):
-            last_trade_date = datetime.strptime(last_trade_date, '%Y-%m-%d').date()
-
-        recent_trades = []
-        for trade in self.transaction_history:
-            trade_date = trade['date']
-            if isinstance(trade_date, str):
-                trade_date = datetime.strptime(trade_date, '%Y-%m-%d').date()
-            elif isinstance(trade_date, datetime):
-                trade_date = trade_date.date()
-
-            days_diff = (last_trade_date - trade_date).days
-            if days_diff < window:
-                recent_trades.append(trade)
-
-        if not recent_trades:
-            return 0.0
+        # 以最近的交易日期为基准, 二分定位距今不足N天的第一笔交易（日期在入账时已转为序数）
+        start = bisect_right(ordinals, ordinals[-1] - window)
+        recent = list(zip(self._trade_actions[start:], self._trade_amounts[start:]))
 
         # 计算买入和卖出金额
-        buy_amount = sum(t['amount'] for t in recent_trades if t['action'] == 'buy')
-        sell_amount = sum(t['amount'] for t in recent_trades if t['action'] == 'sell')
+        buy_amount = sum(amount for action, amount in recent if action == 'buy')
+        sell_amount = sum(amount for action, amount in recent if action == 'sell')
 
         # 计算平均组合市值
-        window_states = self.daily_states[-window:] if len(self.daily_states) >= window else self.daily_states
-        if not window_states:
+        window_values = self.get_state_column('portfolio_value')[-window:].tolist()
+        if not window_values:
             return 0.0
 
-        avg_portfolio_value = sum(s['portfolio_value'] for s in window_states) / len(window_states)
+        avg_portfolio_value = sum(window_values) / len(window_values)
 
         if avg_portfolio_value == 0:
             return 0.0
@@ -254,6 +305,44 @@ class PortfolioStateTracker:
         }
         record.update(extra)
         self.transaction_history.append(record)
+        self._index_trades(record['date'], [record])
+
+    def add_transactions(self, date: str, trades: List[Dict]):
+        """
+        批量添加同一日期的交易记录
+
+        日期只解析一次, 记录字段与逐条调用add_transaction(..., commission=, realized_pnl=)一致
+
+        Args:
+            date: 交易日期
+            trades: 交易列表 [{'symbol', 'action', 'shares', 'price', 'amount', 'commission', 'realized_pnl'}],
+                    commission/realized_pnl缺省为0
+        """
+        if not trades:
+            return
+        trade_date = datetime.strptime(date, '%Y-%m-%d').date() if isinstance(date, str) else date
+        self.transaction_history.extend(
+            {
+                'date': trade_date,
+                'symbol': trade['symbol'],
+                'action': trade['action'],
+                'shares': trade['shares'],
+                'price': trade['price'],
+                'amount': trade['amount'],
+                'commission': trade.get('commission', 0.0),
+                'realized_pnl': trade.get('realized_pnl', 0.0),
+            }
+            for trade in trades
+        )
+        self._index_trades(trade_date, trades)
+
+    def _index_trades(self, trade_date, trades: List[Dict]):
+        """将同一日期的交易写入换手率交易索引"""
+        if trade_date is None:
+            return
+        self._trade_ordinals.extend([trade_date.toordinal()] * len(trades))
+        self._trade_actions.extend(trade['action'] for trade in trades)
+        self._trade_amounts.extend(trade['amount'] for trade in trades)
 
     def update_position(self, symbol: str, shares: int, avg_cost: float):
         """
@@ -331,6 +420,12 @@ class PortfolioStateTracker:
         self.holdings = {}
         self.daily_states = []
         self.transaction_history = []
+        self._trade_ordinals = []
+        self._trade_actions = []
+        self._trade_amounts = []
+        self._init_state_columns()
+        self._last_value = self.initial_capital
+        self._last_holdings_snapshot = {}
 
     def get_summary(self) -> Dict:
         """
@@ -358,6 +453,6 @@ class PortfolioStateTracker:
             'daily_states_count': len(self.daily_states),
             'total_trades': len(self.transaction_history),
             'current_holdings': len(self.holdings),
-            'max_drawdown': min(s['running_max_drawdown'] for s in self.daily_states),
-            'avg_turnover_rate': np.mean([s['turnover_rate'] for s in self.daily_states])
+            'max_drawdown': float(self.get_state_column('running_max_drawdown').min()),
+            'avg_turnover_rate': self.get_state_column('turnover_rate').mean()
         }
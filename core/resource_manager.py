@@ -13,12 +13,18 @@
 日期: 2026-01-13
 """
 
+import time
+
 import psutil
 from loguru import logger
 from enum import Enum
 from typing import Tuple, Optional
 
 
+# 初始化CPU使用率基准, 之后cpu_percent(interval=None)无需阻塞采样
+psutil.cpu_percent(interval=None)
+
+
 class WorkloadType(Enum):
     """工作负载类型"""
     API = "api"                    # Web API请求
@@ -75,6 +81,20 @@ class ResourceManager:
     WARNING_MEMORY_PERCENT = 85  # 内存使用超过85%告警
     CRITICAL_MEMORY_PERCENT = 95  # 内存使用超过95%严重告警
 
+    # 内存读数缓存时长(秒): 按批次检查时避免频繁系统调用
+    SAMPLE_TTL_SECONDS = 0.5
+    _memory_sample = {'t': 0.0, 'memory': None}
+
+    @classmethod
+    def _virtual_memory(cls):
+        """获取内存读数, SAMPLE_TTL_SECONDS内复用上一次结果"""
+        sample = cls._memory_sample
+        now = time.monotonic()
+        if sample['memory'] is None or now - sample['t'] > cls.SAMPLE_TTL_SECONDS:
+            sample['memory'] = psutil.virtual_memory()
+            sample['t'] = now
+        return sample['memory']
+
     @classmethod
     def get_system_status(cls) -> dict:
         """
@@ -83,8 +103,9 @@ class ResourceManager:
         Returns:
             dict: 系统资源状态
         """
-        memory = psutil.virtual_memory()
-        cpu_percent = psutil.cpu_percent(interval=1)
+        memory = cls._virtual_memory()
+        # 非阻塞: 返回自上次调用以来的CPU使用率(模块导入时已初始化基准)
+        cpu_percent = psutil.cpu_percent(interval=None)
 
         return {
             'memory_total_gb': memory.total / (1024**3),
@@ -106,7 +127,7 @@ class ResourceManager:
         Returns:
             Tuple[bool, str]: (是否可以启动, 原因说明)
         """
-        available_gb = psutil.virtual_memory().available / (1024**3)
+        available_gb = cls._virtual_memory().available / (1024**3)
         config = cls.WORKLOAD_ALLOCATION[workload_type]
         required_gb = config["max_memory_gb"]
 
@@ -120,7 +141,7 @@ class ResourceManager:
             )
 
         # 检查内存使用率
-        memory_percent = psutil.virtual_memory().percent
+        memory_percent = cls._virtual_memory().percent
         if memory_percent > cls.CRITICAL_MEMORY_PERCENT:
             return False, (
                 f"系统内存使用率过高: {memory_percent:.1f}% "
@@ -140,7 +161,7 @@ class ResourceManager:
         Returns:
             int: 推荐的worker数量
         """
-        available_gb = psutil.virtual_memory().available / (1024**3)
+        available_gb = cls._virtual_memory().available / (1024**3)
         config = cls.WORKLOAD_ALLOCATION[workload_type]
         max_workers = config["max_workers"]
 
@@ -247,7 +268,7 @@ class ResourceManager:
         Returns:
             int: 调整后的安全批次大小
         """
-        available_gb = psutil.virtual_memory().available / (1024**3)
+        available_gb = cls._virtual_memory().available / (1024**3)
 
         # 内存严重不足时，降低批次大小
         if available_gb < 2.0:
@@ -11,15 +11,23 @@
 日期: 2026-01-16
 """
 
+import heapq
+import time
 from typing import List, Dict, Optional
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import pandas as pd
 import numpy as np
 from loguru import logger
+from sqlalchemy import String, any_, bindparam, func
+from sqlalchemy.dialects.postgresql import ARRAY
 
 from core.etf_universe import EtfUniverse
+from core.numba_kernels import tail_means
+from database.models import EtfHistory
 from database.pg_manager import get_db
+from datafeed.db_dataloader import DbDataLoader
+from datafeed.factor_extends import trend_score
 
 
 @dataclass
@@ -105,7 +113,6 @@ class SmartETFFilter:
         Returns:
             筛选后的ETF代码列表
         """
-        import time
         start_time = time.time()
 
         logger.info("=" * 60)
@@ -120,8 +127,16 @@ class SmartETFFilter:
             logger.warning("基础过滤后无ETF")
             return []
 
+        # 流动性筛选和数量限制使用同一份流动性指标, 只获取一次
+        stats = None
+        needs_liquidity = self.config.min_avg_amount or self.config.min_turnover_rate
+        if needs_liquidity or len(symbols) > self.config.target_count:
+            end_date = datetime.now().date()
+            start_date = end_date - timedelta(days=self.config.liquidity_days)
+            stats = self._get_liquidity_stats(symbols, start_date, end_date)
+
         # 第1层: 流动性筛选
-        symbols = self._layer1_liquidity_filter(symbols)
+        symbols = self._layer1_liquidity_filter(symbols, stats)
         logger.info(f"✓ 第1层(流动性筛选): {len(symbols)} 只ETF")
 
         if not symbols:
@@ -139,7 +154,7 @@ class SmartETFFilter:
 
         # 最终限制数量
         if len(symbols) > self.config.target_count:
-            symbols = self._limit_by_amount(symbols)
+            symbols = self._limit_by_amount(symbols, stats)
             logger.info(f"✓ 最终限制: {len(symbols)} 只ETF (目标{self.config.target_count}只)")
         else:
             logger.info(f"✓ 筛选完成: {len(symbols)} 只ETF (无需限制)")
@@ -160,10 +175,10 @@ class SmartETFFilter:
         # 如果提供了初始ETF列表,需要验证数据可用性
         if initial_symbols:
             # 验证这些ETF是否有足够数据
-            all_etfs = self.universe.get_all_etfs(min_data_days=self.config.min_data_days)
-            # 取交集: 初始列表 ∩ 有足够数据的ETF
-            base_symbols = list(set(initial_symbols) & set(all_etfs))
-            logger.debug(f"基础过滤(数据可用性): {len(initial_symbols)} -> {len(base_symbols)}")
+            valid_etfs = self.universe.get_all_etfs(min_data_days=self.config.min_data_days, as_set=True)
+            # 取交集: 初始列表 ∩ 有足够数据的ETF, 保持初始列表顺序(去重)
+            base_symbols = [s for s in dict.fromkeys(initial_symbols) if s in valid_etfs]
+            logger.opt(lazy=True).debug("基础过滤(数据可用性): {} -> {}", lambda: len(initial_symbols), lambda: len(base_symbols))
             return base_symbols
         else:
             # 使用全市场ETF
@@ -172,71 +187,128 @@ class SmartETFFilter:
             )
             return base_symbols
 
-    def _layer1_liquidity_filter(self, symbols: List[str]) -> List[str]:
+    def _fetch_liquidity_stats(self, symbols: List[str], start_date: date, end_date: date) -> Optional[pd.DataFrame]:
         """
-        第1层: 流动性筛选
+        在数据库端按symbol聚合区间平均换手率和成交额
 
-        指标:
-        - 成交额 (amount)
-        - 换手率 (turnover_rate)
+        每只ETF只返回一行, 不再拉取全部日线到本地计算
+
+        Returns:
+            以symbol为索引、含turnover_rate/amount两列的DataFrame, 查询失败时返回None
         """
-        if not self.config.min_avg_amount and not self.config.min_turnover_rate:
-            return symbols
+        try:
+            with self.db.get_session() as session:
+                query = session.query(
+                    EtfHistory.symbol,
+                    func.avg(EtfHistory.turnover_rate).label('turnover_rate'),
+                    func.avg(EtfHistory.amount).label('amount')
+                ).filter(
+                    # 代码列表作为单个数组参数绑定, 避免IN (...)展开成上千个参数
+                    EtfHistory.symbol == any_(bindparam('symbols', list(symbols), type_=ARRAY(String))),
+                    EtfHistory.date >= start_date,
+                    EtfHistory.date <= end_date
+                ).group_by(
+                    EtfHistory.symbol
+                )
+
+                results = query.all()
+
+            stats = pd.DataFrame(results, columns=['symbol', 'turnover_rate', 'amount'])
+            return stats.set_index('symbol').astype(float)
+
+        except Exception as e:
+            logger.warning(f"数据库聚合流动性指标失败, 改为本地计算: {e}")
+            return None
 
+    def _get_liquidity_stats(self, symbols: List[str], start_date: date, end_date: date) -> Optional[pd.DataFrame]:
+        """
+        获取流动性指标, 优先数据库端聚合, 失败时加载日线数据本地计算
+
+        Returns:
+            以symbol为索引、含turnover_rate/amount两列的DataFrame, 无法获取时返回None
+        """
+        stats = self._fetch_liquidity_stats(symbols, start_date, end_date)
+        if stats is not None:
+            return stats
+
+        history = self._load_liquidity_data(symbols, start_date, end_date)
+        if history is None:
+            return None
+        return self._liquidity_stats(history)
+
+    def _load_liquidity_data(self, symbols: List[str], start_date: date, end_date: date) -> Optional[pd.DataFrame]:
+        """
+        一次查询加载流动性统计区间内全部ETF的日线数据
+
+        直接使用批量查询返回的长表, 不再按标的拆分成多个DataFrame后重新拼接
+
+        Returns:
+            按symbol、date排序的日线长表, 加载失败时返回None
+        """
         try:
-            from datafeed.db_dataloader import DbDataLoader
+            # 只查询计算所需的列
+            return self.db.batch_get_etf_history(symbols, start_date, end_date, columns=['turnover_rate', 'amount'])
+        except Exception as e:
+            logger.error(f"加载流动性数据失败: {e}")
+            return None
 
-            # 计算日期范围
-            end_date = datetime.now().strftime('%Y%m%d')
-            start_date = (datetime.strptime(end_date, '%Y%m%d') -
-                         timedelta(days=self.config.liquidity_days)).strftime('%Y%m%d')
+    def _liquidity_stats(self, history: pd.DataFrame) -> pd.DataFrame:
+        """
+        计算最近liquidity_days天的平均换手率和成交额
 
-            # 批量获取历史数据
-            loader = DbDataLoader(auto_download=False)
-            dfs = loader.read_dfs(
-                symbols=symbols,
-                start_date=start_date,
-                end_date=end_date
-            )
+        在日线长表上按symbol分段, 由内核一次求出所有ETF的尾部窗口均值, 替代逐只ETF的tail().mean()
 
-            if not dfs:
-                logger.warning("未能加载流动性数据")
-                return symbols
+        Args:
+            history: 日线长表, 同一symbol内按日期升序
 
-            # 计算流动性指标
-            qualified = []
-            for symbol in symbols:
-                if symbol not in dfs:
-                    continue
+        Returns:
+            以symbol为索引、含turnover_rate/amount两列的DataFrame, 无数据的ETF不在结果中
+        """
+        if history.empty:
+            return pd.DataFrame(columns=['turnover_rate', 'amount'], dtype=float)
 
-                df = dfs[symbol]
-                if df.empty:
-                    continue
+        # 按symbol编码后稳定排序, 同一symbol的行连续且保持日期顺序
+        codes, uniques = pd.factorize(history['symbol'])
+        order = np.argsort(codes, kind='stable')
+        values = history.reindex(columns=['turnover_rate', 'amount']).to_numpy(dtype=float)[order]
 
-                passed = True
+        # 每个symbol在values中的行区间, 内核按区间求最近liquidity_days行的均值(忽略NaN)
+        offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(uniques)), out=offsets[1:])
+        means = tail_means(values, offsets, self.config.liquidity_days)
+        return pd.DataFrame(means, index=list(uniques), columns=['turnover_rate', 'amount'])
 
-                # 检查换手率
-                if self.config.min_turnover_rate and 'turnover_rate' in df.columns:
-                    recent_turnover = df['turnover_rate'].tail(self.config.liquidity_days)
+    def _layer1_liquidity_filter(self, symbols: List[str], stats: Optional[pd.DataFrame]) -> List[str]:
+        """
+        第1层: 流动性筛选
 
-                    # 检查数据是否为空或全为NaN
-                    if not recent_turnover.empty and not recent_turnover.isna().all():
-                        if recent_turnover.mean() < self.config.min_turnover_rate:
-                            passed = False
+        指标:
+        - 成交额 (amount)
+        - 换手率 (turnover_rate)
 
-                # 检查成交额
-                if self.config.min_avg_amount and 'amount' in df.columns:
-                    recent_amount = df['amount'].tail(self.config.liquidity_days)
+        Args:
+            symbols: 待筛选ETF列表
+            stats: 流动性指标, 见_get_liquidity_stats
+        """
+        if not self.config.min_avg_amount and not self.config.min_turnover_rate:
+            return symbols
 
-                    # 检查数据是否为空或全为NaN
-                    if not recent_amount.empty and not recent_amount.isna().all():
-                        if recent_amount.mean() < self.config.min_avg_amount:
-                            passed = False
+        try:
+            if stats is None:
+                logger.warning("未能加载流动性数据")
+                return symbols
 
-                if passed:
-                    qualified.append(symbol)
+            # 无有效数据(NaN)的指标不参与判断
+            mask = pd.Series(True, index=stats.index)
+            if self.config.min_turnover_rate:
+                mask &= ~(stats['turnover_rate'] < self.config.min_turnover_rate)
+            if self.config.min_avg_amount:
+                mask &= ~(stats['amount'] < self.config.min_avg_amount)
+
+            passed = set(stats.index[mask])
+            qualified = [s for s in symbols if s in passed]
 
-            logger.debug(f"流动性筛选: {len(symbols)} -> {len(qualified)}")
+            logger.opt(lazy=True).debug("流动性筛选: {} -> {}", lambda: len(symbols), lambda: len(qualified))
             return qualified
 
         except Exception as e:
@@ -260,49 +332,59 @@ class SmartETFFilter:
             return symbols
 
         try:
-            from datafeed.db_dataloader import DbDataLoader
-
             # 计算日期范围 (需要足够历史数据计算指标)
             max_period = max(
                 cfg.rsi_period or 14,
                 cfg.roc_period or 20,
                 60  # 趋势评分等
             )
-            end_date = datetime.now().strftime('%Y%m%d')
-            start_date = (datetime.strptime(end_date, '%Y%m%d') -
-                         timedelta(days=max_period * 2)).strftime('%Y%m%d')
+            end_dt = datetime.now()
+            end_date = end_dt.strftime('%Y%m%d')
+            start_date = (end_dt - timedelta(days=max_period * 2)).strftime('%Y%m%d')
 
             # 批量获取历史数据
             loader = DbDataLoader(auto_download=False)
             dfs = loader.read_dfs(
                 symbols=symbols,
                 start_date=start_date,
-                end_date=end_date
+                end_date=end_date,
+                columns=['high', 'low', 'close']  # 只读取指标计算所需的列
             )
 
             if not dfs:
                 logger.warning("未能加载技术指标数据")
                 return symbols
 
+            # 各ETF数据来自同一张表, 列结构相同, 列检查在循环外只做一次
+            columns = next(iter(dfs.values())).columns
+            if 'close' not in columns:
+                logger.warning("技术指标数据缺少close列")
+                return []
+            has_date = 'date' in columns
+
             qualified = []
             for symbol in symbols:
                 if symbol not in dfs:
                     continue
 
                 df = dfs[symbol]
-                if df.empty or 'close' not in df.columns:
+                if df.empty:
                     continue
 
                 # 确保日期索引
-                if 'date' in df.columns:
+                if has_date:
                     df['date'] = pd.to_datetime(df['date'])
                     df = df.set_index('date')
 
+                # 收盘价只取一次, 末值读取直接走ndarray
+                close = df['close']
+                close_arr = close.to_numpy(copy=False)
+
                 passed = True
 
                 # 1. RSI筛选
                 if cfg.rsi_min is not None or cfg.rsi_max is not None:
-                    rsi = self._calculate_rsi(df['close'], cfg.rsi_period)
+                    rsi = self._calculate_rsi(close, cfg.rsi_period)
                     latest_rsi = rsi.iloc[-1] if len(rsi) > 0 else None
 
                     if latest_rsi is not None and not pd.isna(latest_rsi):
@@ -313,7 +395,7 @@ class SmartETFFilter:
 
                 # 2. MACD金叉筛选
                 if cfg.macd_golden_cross and passed:
-                    macd, signal, _ = self._calculate_macd(df['close'])
+                    macd, signal, _ = self._calculate_macd(close)
                     if len(macd) >= 2:
                         # 金叉: MACD上穿信号线
                         latest_macd = macd.iloc[-1]
@@ -331,7 +413,7 @@ class SmartETFFilter:
                 # 3. 波动率筛选
                 if cfg.max_volatility_pct is not None and passed:
                     atr = self._calculate_atr(df)
-                    atr_pct = atr.iloc[-1] / df['close'].iloc[-1] * 100 if len(atr) > 0 else 0
+                    atr_pct = atr.iloc[-1] / close_arr[-1] * 100 if len(atr) > 0 else 0
 
                     if atr_pct > cfg.max_volatility_pct:
                         passed = False
@@ -339,8 +421,7 @@ class SmartETFFilter:
                 # 4. 趋势评分筛选
                 if cfg.min_trend_score is not None and passed:
                     try:
-                        from datafeed.factor_extends import trend_score
-                        ts = trend_score(df['close'], 25)
+                        ts = trend_score(close, 25)
                         latest_ts = ts.iloc[-1] if len(ts) > 0 else 0
 
                         if latest_ts < cfg.min_trend_score:
@@ -351,15 +432,15 @@ class SmartETFFilter:
                 # 5. 动量筛选
                 if cfg.min_roc is not None and passed:
                     period = cfg.roc_period
-                    if len(df['close']) > period:
-                        roc = df['close'].iloc[-1] / df['close'].iloc[-period] - 1
+                    if len(close_arr) > period:
+                        roc = close_arr[-1] / close_arr[-period] - 1
                         if roc < cfg.min_roc:
                             passed = False
 
                 if passed:
                     qualified.append(symbol)
 
-            logger.debug(f"技术指标筛选: {len(symbols)} -> {len(qualified)}")
+            logger.opt(lazy=True).debug("技术指标筛选: {} -> {}", lambda: len(symbols), lambda: len(qualified))
             return qualified
 
         except Exception as e:
@@ -400,61 +481,32 @@ class SmartETFFilter:
         tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
         return tr.rolling(period).mean()
 
-    def _limit_by_amount(self, symbols: List[str]) -> List[str]:
+    def _limit_by_amount(self, symbols: List[str], stats: Optional[pd.DataFrame]) -> List[str]:
         """
         按成交额限制数量
 
         策略: 按成交额排序,选择前N只
+
+        Args:
+            symbols: 待限制ETF列表
+            stats: 流动性指标, 见_get_liquidity_stats
         """
         try:
-            from datafeed.db_dataloader import DbDataLoader
-
-            # 计算日期范围
-            end_date = datetime.now().strftime('%Y%m%d')
-            start_date = (datetime.strptime(end_date, '%Y%m%d') -
-                         timedelta(days=self.config.liquidity_days)).strftime('%Y%m%d')
-
-            # 批量获取历史数据
-            loader = DbDataLoader(auto_download=False)
-            dfs = loader.read_dfs(
-                symbols=symbols,
-                start_date=start_date,
-                end_date=end_date
-            )
-
-            if not dfs:
-                logger.warning("未能加载成交额数据,返回前{self.config.target_count}只")
+            if stats is None:
+                logger.warning(f"未能加载成交额数据,返回前{self.config.target_count}只")
                 return symbols[:self.config.target_count]
 
-            # 计算每个ETF的平均成交额并排序
-            etf_amounts = []
-            for symbol in symbols:
-                if symbol not in dfs:
-                    continue
+            # 按平均成交额降序取前N只(无成交额数据的ETF不参与), 成交额相同时保持原顺序
+            # 目标数量通常远小于候选数, 堆选前N只只需O(n log N)次比较, 不做全量排序
+            amounts = stats['amount'].reindex(list(dict.fromkeys(symbols))).dropna()
+            top = heapq.nlargest(self.config.target_count, zip(amounts.index, amounts.to_numpy()),
+                                 key=lambda x: x[1])
+            result = [symbol for symbol, _ in top]
 
-                df = dfs[symbol]
-                if df.empty or 'amount' not in df.columns:
-                    continue
-
-                # 计算平均成交额
-                recent_amount = df['amount'].tail(self.config.liquidity_days)
-
-                # 检查数据是否为空或全为NaN
-                if recent_amount.empty or recent_amount.isna().all():
-                    continue
-
-                avg_amount = recent_amount.mean()
-
-                if pd.notna(avg_amount):
-                    etf_amounts.append((symbol, avg_amount))
-
-            # 按成交额降序排序
-            etf_amounts.sort(key=lambda x: x[1], reverse=True)
-
-            # 取前N只
-            result = [item[0] for item in etf_amounts[:self.config.target_count]]
-
-            logger.debug(f"按成交额限制数量: {len(symbols)} -> {len(result)} (前{self.config.target_count}只)")
+            logger.opt(lazy=True).debug(
+                "按成交额限制数量: {} -> {} (前{}只)",
+                lambda: len(symbols), lambda: len(result), lambda: self.config.target_count
+            )
             return result
 
         except Exception as e:
@@ -11,13 +11,19 @@
 日期: 2026-01-07
 """
 
+import time
 from typing import List, Dict, Optional
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import pandas as pd
+import numpy as np
 from loguru import logger
+from sqlalchemy import String, any_, bindparam, func, or_
+from sqlalchemy.dialects.postgresql import ARRAY
 
+from core.numba_kernels import tail_means
 from core.stock_universe import StockUniverse
+from database.models import StockFundamentalDaily, StockHistory, StockMetadata
 from database.pg_manager import get_db
 
 
@@ -78,7 +84,6 @@ class SmartStockFilter:
         Returns:
             筛选后的股票代码列表
         """
-        import time
         start_time = time.time()
 
         logger.info("=" * 60)
@@ -102,7 +107,12 @@ class SmartStockFilter:
             return []
 
         # 第2层: 流动性筛选
-        symbols = self._layer2_liquidity_filter(symbols)
+        stats = None
+        if self.config.min_turnover_rate or self.config.min_avg_amount:
+            end_date = datetime.now().date()
+            start_date = end_date - timedelta(days=self.config.liquidity_days)
+            stats = self._get_liquidity_stats(symbols, start_date, end_date)
+        symbols = self._layer2_liquidity_filter(symbols, stats)
         logger.info(f"✓ 第2层(流动性筛选): {len(symbols)} 只股票")
 
         # 最终限制数量
@@ -160,70 +170,137 @@ class SmartStockFilter:
                 symbols,
                 min_mv=self.config.min_market_cap
             )
-            logger.debug(f"市值筛选(>{self.config.min_market_cap}亿): {len(symbols)} -> {len(filtered)}")
+            logger.opt(lazy=True).debug(
+                "市值筛选(>{}亿): {} -> {}",
+                lambda: self.config.min_market_cap, lambda: len(symbols), lambda: len(filtered)
+            )
             return filtered
         except Exception as e:
             logger.error(f"市值筛选失败: {e}")
             return symbols
 
-    def _layer2_liquidity_filter(self, symbols: List[str]) -> List[str]:
+    def _fetch_liquidity_stats(self, symbols: List[str], start_date: date, end_date: date) -> Optional[pd.DataFrame]:
+        """
+        在数据库端按symbol聚合区间平均换手率和成交额
+
+        每只股票只返回一行, 不再拉取全部日线到本地计算
+
+        Returns:
+            以symbol为索引、含turnover_rate/amount两列的DataFrame, 查询失败时返回None
+        """
+        try:
+            with self.db.get_session() as session:
+                query = session.query(
+                    StockHistory.symbol,
+                    func.avg(StockHistory.turnover_rate).label('turnover_rate'),
+                    func.avg(StockHistory.amount).label('amount')
+                ).filter(
+                    # 代码列表作为单个数组参数绑定, 避免IN (...)展开成上千个参数
+                    StockHistory.symbol == any_(bindparam('symbols', list(symbols), type_=ARRAY(String))),
+                    StockHistory.date >= start_date,
+                    StockHistory.date <= end_date
+                ).group_by(
+                    StockHistory.symbol
+                )
+
+                results = query.all()
+
+            stats = pd.DataFrame(results, columns=['symbol', 'turnover_rate', 'amount'])
+            return stats.set_index('symbol').astype(float)
+
+        except Exception as e:
+            logger.warning(f"数据库聚合流动性指标失败, 改为本地计算: {e}")
+            return None
+
+    def _get_liquidity_stats(self, symbols: List[str], start_date: date, end_date: date) -> Optional[pd.DataFrame]:
+        """
+        获取流动性指标, 优先数据库端聚合, 失败时加载日线数据本地计算
+
+        Returns:
+            以symbol为索引、含turnover_rate/amount两列的DataFrame, 无法获取时返回None
+        """
+        stats = self._fetch_liquidity_stats(symbols, start_date, end_date)
+        if stats is not None:
+            return stats
+
+        history = self._load_liquidity_data(symbols, start_date, end_date)
+        if history is None:
+            return None
+        return self._liquidity_stats(history)
+
+    def _load_liquidity_data(self, symbols: List[str], start_date: date, end_date: date) -> Optional[pd.DataFrame]:
+        """
+        一次查询加载流动性统计区间内全部股票的日线数据
+
+        直接使用批量查询返回的长表, 不再按标的拆分成多个DataFrame后重新拼接
+
+        Returns:
+            按symbol、date排序的日线长表, 加载失败时返回None
+        """
+        try:
+            # 只查询计算所需的列
+            return self.db.batch_get_stock_history(symbols, start_date, end_date, columns=['turnover_rate', 'amount'])
+        except Exception as e:
+            logger.error(f"加载流动性数据失败: {e}")
+            return None
+
+    def _liquidity_stats(self, history: pd.DataFrame) -> pd.DataFrame:
+        """
+        计算最近liquidity_days天的平均换手率和成交额
+
+        在日线长表上按symbol分段, 由内核一次求出所有股票的尾部窗口均值, 替代逐只股票的tail().mean()
+
+        Args:
+            history: 日线长表, 同一symbol内按日期升序
+
+        Returns:
+            以symbol为索引、含turnover_rate/amount两列的DataFrame, 无数据的股票不在结果中
+        """
+        if history.empty:
+            return pd.DataFrame(columns=['turnover_rate', 'amount'], dtype=float)
+
+        # 按symbol编码后稳定排序, 同一symbol的行连续且保持日期顺序
+        codes, uniques = pd.factorize(history['symbol'])
+        order = np.argsort(codes, kind='stable')
+        values = history.reindex(columns=['turnover_rate', 'amount']).to_numpy(dtype=float)[order]
+
+        # 每个symbol在values中的行区间, 内核按区间求最近liquidity_days行的均值(忽略NaN)
+        offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(uniques)), out=offsets[1:])
+        means = tail_means(values, offsets, self.config.liquidity_days)
+        return pd.DataFrame(means, index=list(uniques), columns=['turnover_rate', 'amount'])
+
+    def _layer2_liquidity_filter(self, symbols: List[str], stats: Optional[pd.DataFrame]) -> List[str]:
         """
         第2层: 流动性筛选
 
         指标:
         - 换手率
         - 日均成交额
+
+        Args:
+            symbols: 待筛选股票列表
+            stats: 流动性指标, 见_get_liquidity_stats
         """
         if not self.config.min_turnover_rate and not self.config.min_avg_amount:
             return symbols
 
         try:
-            from datafeed.db_dataloader import DbDataLoader
-
-            # 批量获取历史数据
-            end_date = datetime.now().strftime('%Y%m%d')
-            start_date = (datetime.strptime(end_date, '%Y%m%d') -
-                         timedelta(days=self.config.liquidity_days)).strftime('%Y%m%d')
-
-            loader = DbDataLoader(auto_download=False)
-            dfs = loader.read_dfs(
-                symbols=symbols,
-                start_date=start_date,
-                end_date=end_date
-            )
-
-            if not dfs:
+            if stats is None:
                 logger.warning("未能加载流动性数据")
                 return symbols
 
-            # 计算流动性指标
-            qualified = []
-            for symbol in symbols:
-                if symbol not in dfs:
-                    continue
-
-                df = dfs[symbol]
-                if df.empty:
-                    continue
+            # 无有效数据(NaN)的指标不参与判断
+            mask = pd.Series(True, index=stats.index)
+            if self.config.min_turnover_rate:
+                mask &= ~(stats['turnover_rate'] < self.config.min_turnover_rate)
+            if self.config.min_avg_amount:
+                mask &= ~(stats['amount'] < self.config.min_avg_amount)
 
-                passed = True
+            passed = set(stats.index[mask])
+            qualified = [s for s in symbols if s in passed]
 
-                # 检查换手率
-                if self.config.min_turnover_rate and 'turnover_rate' in df.columns:
-                    recent_turnover = df['turnover_rate'].tail(self.config.liquidity_days)
-                    if recent_turnover.mean() < self.config.min_turnover_rate:
-                        passed = False
-
-                # 检查成交额
-                if self.config.min_avg_amount and 'amount' in df.columns:
-                    recent_amount = df['amount'].tail(self.config.liquidity_days)
-                    if recent_amount.mean() < self.config.min_avg_amount:
-                        passed = False
-
-                if passed:
-                    qualified.append(symbol)
-
-            logger.debug(f"流动性筛选: {len(symbols)} -> {len(qualified)}")
+            logger.opt(lazy=True).debug("流动性筛选: {} -> {}", lambda: len(symbols), lambda: len(qualified))
             return qualified
 
         except Exception as e:
@@ -237,29 +314,21 @@ class SmartStockFilter:
                           timedelta(days=self.config.exclude_new_ipo_days)).date()
 
             with self.db.get_session() as session:
-                from database.models import StockMetadata
-
-                # 获取股票元数据
+                # 在数据库端筛选上市日期早于截止日期的股票, 没有上市日期的保留
+                # 代码列表作为单个数组参数绑定, 避免IN (...)展开成上千个参数
                 query = session.query(
-                    StockMetadata.symbol,
-                    StockMetadata.list_date
+                    StockMetadata.symbol
                 ).filter(
-                    StockMetadata.symbol.in_(symbols)
+                    StockMetadata.symbol == any_(bindparam('symbols', list(symbols), type_=ARRAY(String))),
+                    or_(
+                        StockMetadata.list_date.is_(None),
+                        StockMetadata.list_date < cutoff_date
+                    )
                 )
 
-                results = query.all()
+                filtered = [r[0] for r in query.all()]
 
-                # 筛选上市日期早于截止日期的股票
-                filtered = []
-                for symbol, list_date in results:
-                    if list_date is None:
-                        # 如果没有上市日期,保留该股票
-                        filtered.append(symbol)
-                    elif list_date < cutoff_date:
-                        filtered.append(symbol)
-                    # 否则过滤掉(新上市)
-
-                logger.debug(f"新股过滤: {len(symbols)} -> {len(filtered)}")
+                logger.opt(lazy=True).debug("新股过滤: {} -> {}", lambda: len(symbols), lambda: len(filtered))
                 return filtered
 
         except Exception as e:
@@ -274,8 +343,6 @@ class SmartStockFilter:
         """
         try:
             with self.db.get_session() as session:
-                from database.models import StockFundamentalDaily
-
                 # 按市值排序,取前N只
                 query = session.query(
                     StockFundamentalDaily.symbol
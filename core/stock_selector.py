@@ -472,8 +472,10 @@ class StockSelector:
                     current_close = latest['close']
 
                     # 1. 检查偏离度
-                    ma5 = stock_df['close'].tail(5).mean()
-                    ma10 = stock_df['close'].tail(10).mean()
+                    # 直接在float数组上求均值, 跳过逐只股票的Series.tail/mean开销
+                    closes = stock_df['close'].to_numpy(dtype=np.float64, na_value=np.nan)
+                    ma5 = np.nanmean(closes[-5:])
+                    ma10 = np.nanmean(closes[-10:])
 
                     deviation_5d = abs(current_close - ma5) / ma5 * 100
                     deviation_10d = abs(current_close - ma10) / ma10 * 100
@@ -484,7 +486,6 @@ class StockSelector:
                     # 2. 检查MACD金叉
                     if self.dip_config.require_macd_golden_cross:
                         if talib is not None:
-                            closes = stock_df['close'].values
                             macd, signal, _ = talib.MACD(closes)
 
                             if len(macd) >= 2:
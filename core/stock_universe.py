@@ -65,6 +65,10 @@ class StockUniverse:
     3. 历史快照（可选）
     """
 
+    # get_all_stocks结果的进程内TTL缓存, 所有实例共享: {筛选参数: (symbols, 写入时间)}
+    CACHE_TTL = 3600
+    _stock_cache: Dict[tuple, tuple] = {}
+
     def __init__(self, db=None):
         """
         初始化股票池管理器
@@ -75,12 +79,20 @@ class StockUniverse:
         self.db = db if db else get_db()
         logger.debug('股票池管理器初始化完成')
 
+    @classmethod
+    def invalidate_cache(cls) -> None:
+        """清空get_all_stocks缓存(stock_history或元数据更新后调用)"""
+        cls._stock_cache.clear()
+        logger.debug('股票池缓存已清空')
+
     def get_all_stocks(self, exclude_st=True, exclude_suspend=True,
                       exclude_new_ipo_days=None, min_data_days=180,
-                      exclude_restricted_stocks=True) -> List[str]:
+                      exclude_restricted_stocks=True, use_cache: bool = True) -> List[str]:
         """
         获取所有可交易股票（基于实际交易数据）
 
+        多次查询与元数据过滤代价较高, 按筛选参数缓存CACHE_TTL秒
+
         Args:
             exclude_st: 是否排除ST股票（需要元数据支持）
             exclude_suspend: 是否排除停牌股票（需要元数据支持）
@@ -88,10 +100,18 @@ class StockUniverse:
             min_data_days: 最小数据天数，默认180天（半年）
             exclude_restricted_stocks: 是否排除限制交易股票（科创板688xxx、创业板300xxx、北交所BJ）
                                        仅保留主板股票。默认True。
+            use_cache: 是否使用缓存结果
 
         Returns:
             股票代码列表
         """
+        cache_key = (bool(exclude_st), bool(exclude_suspend), min_data_days, bool(exclude_restricted_stocks))
+        if use_cache:
+            cached = self._stock_cache.get(cache_key)
+            if cached is not None and time.time() - cached[1] < self.CACHE_TTL:
+                logger.debug('使用缓存的股票列表: {}只', len(cached[0]))
+                return list(cached[0])
+
         def _query_stocks():
             from database.models import StockHistory
             from sqlalchemy import distinct
@@ -153,11 +173,14 @@ class StockUniverse:
                 return symbols
 
         try:
-            return retry_on_db_error(_query_stocks, max_retries=3, delay=1.0)
+            symbols = retry_on_db_error(_query_stocks, max_retries=3, delay=1.0)
         except Exception as e:
             logger.error(f'获取股票列表失败: {e}')
             return []
 
+        self._stock_cache[cache_key] = (tuple(symbols), time.time())
+        return symbols
+
     def filter_by_market_cap(self, symbols: List[str],
                             min_mv: Optional[float] = None,
                             max_mv: Optional[float] = None) -> List[str]:
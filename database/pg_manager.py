@@ -45,6 +45,13 @@ def query_timer(query_name: str):
             logger.debug(f'⚡ 查询 [{query_name}]: {elapsed:.3f}秒')
 
 
+def _history_entities(model, columns: Optional[List[str]] = None) -> list:
+    """批量行情查询的查询实体: 未指定columns时查询整行, 否则只查询symbol、date和指定列"""
+    if not columns:
+        return [model]
+    return [model.symbol, model.date] + [getattr(model, c) for c in columns if c not in ('symbol', 'date')]
+
+
 class PostgreSQLManager:
     """PostgreSQL 数据库管理器 (使用 SQLAlchemy ORM)"""
 
@@ -188,7 +195,7 @@ class PostgreSQLManager:
             return pd.read_sql(query.statement, session.bind)
 
     def batch_get_etf_history(self, symbols: List[str], start_date: date = None,
-                             end_date: date = None) -> pd.DataFrame:
+                             end_date: date = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
         """
         批量获取多个ETF的历史数据（性能优化 + 性能监控）
 
@@ -198,6 +205,7 @@ class PostgreSQLManager:
             symbols: ETF代码列表
             start_date: 开始日期
             end_date: 结束日期
+            columns: 只查询的数据列(symbol、date总是包含), 为None时查询全部列
 
         Returns:
             DataFrame: 包含所有ETF的历史数据
@@ -205,7 +213,7 @@ class PostgreSQLManager:
         query_name = f"batch_etf_{len(symbols)}_symbols"
         with query_timer(query_name):
             with self.get_session() as session:
-                query = session.query(EtfHistory).filter(
+                query = session.query(*_history_entities(EtfHistory, columns)).filter(
                     EtfHistory.symbol.in_(symbols)
                 )
 
@@ -581,7 +589,7 @@ class PostgreSQLManager:
             return pd.read_sql(query.statement, session.bind)
 
     def batch_get_stock_history(self, symbols: List[str], start_date: date = None,
-                               end_date: date = None) -> pd.DataFrame:
+                               end_date: date = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
         """
         批量获取多个股票的历史数据（性能优化 + 性能监控）
 
@@ -591,6 +599,7 @@ class PostgreSQLManager:
             symbols: 股票代码列表
             start_date: 开始日期
             end_date: 结束日期
+            columns: 只查询的数据列(symbol、date总是包含), 为None时查询全部列
 
         Returns:
             DataFrame: 包含所有股票的历史数据
@@ -598,7 +607,7 @@ class PostgreSQLManager:
         query_name = f"batch_stock_{len(symbols)}_symbols"
         with query_timer(query_name):
             with self.get_session() as session:
-                query = session.query(StockHistory).filter(
+                query = session.query(*_history_entities(StockHistory, columns)).filter(
                     StockHistory.symbol.in_(symbols)
                 )
 
@@ -655,7 +664,7 @@ class PostgreSQLManager:
             return pd.read_sql(query.statement, session.bind)
 
     def batch_get_stock_history_qfq(self, symbols: List[str], start_date: date = None,
-                                   end_date: date = None) -> pd.DataFrame:
+                                   end_date: date = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
         """
         批量获取多个股票的前复权历史数据（性能优化）
 
@@ -665,6 +674,7 @@ class PostgreSQLManager:
             symbols: 股票代码列表
             start_date: 开始日期
             end_date: 结束日期
+            columns: 只查询的数据列(symbol、date总是包含), 为None时查询全部列
 
         Returns:
             DataFrame: 包含所有股票的前复权历史数据
@@ -672,7 +682,7 @@ class PostgreSQLManager:
         query_name = f"batch_stock_qfq_{len(symbols)}_symbols"
         with query_timer(query_name):
             with self.get_session() as session:
-                query = session.query(StockHistoryQfq).filter(
+                query = session.query(*_history_entities(StockHistoryQfq, columns)).filter(
                     StockHistoryQfq.symbol.in_(symbols)
                 )
 
@@ -815,7 +825,7 @@ class PostgreSQLManager:
             return pd.read_sql(query.statement, session.bind)
 
     def batch_get_etf_history_qfq(self, symbols: List[str], start_date: date = None,
-                                 end_date: date = None) -> pd.DataFrame:
+                                 end_date: date = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
         """
         批量获取多个ETF的前复权历史数据（性能优化）
 
@@ -825,6 +835,7 @@ class PostgreSQLManager:
             symbols: ETF代码列表
             start_date: 开始日期
             end_date: 结束日期
+            columns: 只查询的数据列(symbol、date总是包含), 为None时查询全部列
 
         Returns:
             DataFrame: 包含所有ETF的前复权历史数据
@@ -832,7 +843,7 @@ class PostgreSQLManager:
         query_name = f"batch_etf_qfq_{len(symbols)}_symbols"
         with query_timer(query_name):
             with self.get_session() as session:
-                query = session.query(EtfHistoryQfq).filter(
+                query = session.query(*_history_entities(EtfHistoryQfq, columns)).filter(
                     EtfHistoryQfq.symbol.in_(symbols)
                 )
 
@@ -163,8 +163,17 @@ class DbDataLoader:
             logger.error(f'从 PostgreSQL 读取 {symbol} 失败: {e}')
             return None
 
-    def read_dfs(self, symbols: list[str], start_date='20100101', end_date=datetime.now().strftime('%Y%m%d')):
-        """读取多个标的的数据（批量查询优化版本）"""
+    def read_dfs(self, symbols: list[str], start_date='20100101', end_date=datetime.now().strftime('%Y%m%d'),
+                 columns: list[str] = None):
+        """
+        读取多个标的的数据（批量查询优化版本）
+
+        Args:
+            symbols: 标的代码列表
+            start_date: 开始日期(YYYYMMDD)
+            end_date: 结束日期(YYYYMMDD)
+            columns: 只读取的数据列(symbol、date总是包含), 为None时读取全部列
+        """
         # ⭐ ADD: Performance monitoring
         import time
         from concurrent.futures import ThreadPoolExecutor
@@ -209,58 +218,122 @@ class DbDataLoader:
             STOCK_BATCH_SIZE = 500  # Reduced from 1000 (save memory)
 
         # ⭐ ADD: Memory monitoring for 8GB system
+        # 多批次时并行查询: 批量查询为IO密集, 数据库驱动等待结果时释放GIL
+        BATCH_WORKERS = 4
         try:
             import psutil
             available_mem_gb = psutil.virtual_memory().available / (1024**3)
             if available_mem_gb < 2.0:
                 logger.warning(f"⚠️ Low memory: {available_mem_gb:.2f}GB available, reducing batch size by 50%")
                 STOCK_BATCH_SIZE = max(50, STOCK_BATCH_SIZE // 2)
+                BATCH_WORKERS = 1  # 内存紧张时串行查询, 避免多个批次结果同时驻留
         except ImportError:
             logger.debug("psutil not available, skipping memory check")
 
-        logger.debug(f'批量查询配置: ETF_BATCH={ETF_BATCH_SIZE}, STOCK_BATCH={STOCK_BATCH_SIZE}')
+        logger.debug(f'批量查询配置: ETF_BATCH={ETF_BATCH_SIZE}, STOCK_BATCH={STOCK_BATCH_SIZE}, WORKERS={BATCH_WORKERS}')
+
+        def run_batches(load_one, batch_symbols, batch_size):
+            """按批次执行load_one(批次序号, 批次代码), 多批次时用线程池并行, 结果按批次顺序合并"""
+            batches = [batch_symbols[i:i+batch_size] for i in range(0, len(batch_symbols), batch_size)]
+            results = {}
+            if len(batches) <= 1 or BATCH_WORKERS <= 1:
+                for n, batch in enumerate(batches):
+                    results.update(load_one(n, batch))
+                return results
+
+            with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(batches))) as executor:
+                for part in executor.map(load_one, range(len(batches)), batches):
+                    results.update(part)
+            return results
+
+        def read_each(batch):
+            """
+            逐个标的查询(批量查询失败时的回退), 多个小查询并发以重叠网络往返
+
+            所有批次的回退共用同一个fallback_executor, 总并发(含自动下载)不超过BATCH_WORKERS,
+            避免嵌套线程池在数据库已经出错时占满连接池
+            """
+            if len(batch) <= 1 or BATCH_WORKERS <= 1:
+                frames = [self._read_postgres(s, start_date, end_date) for s in batch]
+            else:
+                frames = list(fallback_executor.map(lambda s: self._read_postgres(s, start_date, end_date), batch))
+            return {s: df for s, df in zip(batch, frames) if df is not None}
+
+        def split_by_symbol(df_all):
+            """批量查询结果按标的拆分"""
+            results = {}
+            # ✅ OPTIMIZATION 3: Use groupby instead of loop for symbol filtering
+            # 先把symbol编码为整数再分组, 避免对字符串逐行哈希比较
+            # factorize按出现顺序编码, 分组无需再排序
+            codes, uniques = pd.factorize(df_all['symbol'])
+            for code, group in df_all.groupby(codes, sort=False):
+                symbol = uniques[code]
+                group = group.copy()
+                group['date'] = pd.to_datetime(group['date']).dt.strftime('%Y%m%d')
+                group.dropna(inplace=True)
+                results[symbol] = group
+            return results
 
         # ⭐ OPTIMIZATION 2: Define batch loading functions
+        def load_one_etf_batch(n, batch):
+            """Load one ETF batch"""
+            try:
+                logger.debug(f'批量查询ETF: 第 {n + 1} 批，共 {len(batch)} 只ETF')
+                query_start = time.time()
+
+                # ✅ Date filtering happens in SQL (fast)
+                # 根据 adjust_type 选择查询前复权还是后复权表
+                if self.adjust_type == 'qfq':
+                    df_all = self.db.batch_get_etf_history_qfq(batch, start_date_fmt, end_date_fmt, columns=columns)
+                else:
+                    df_all = self.db.batch_get_etf_history(batch, start_date_fmt, end_date_fmt, columns=columns)
+
+                query_elapsed = time.time() - query_start
+                logger.debug(f'  查询耗时: {query_elapsed:.2f}秒, 返回 {len(df_all)} 行')
+
+                if not df_all.empty:
+                    return split_by_symbol(df_all)
+                logger.warning(f'批量查询ETF（第 {n + 1} 批）未返回数据')
+                return {}
+
+            except Exception as e:
+                logger.error(f'批量查询ETF失败（第 {n + 1} 批）: {e}，回退到单个查询')
+                # Fallback to individual queries
+                return read_each(batch)
+
+        def load_one_stock_batch(n, batch):
+            """Load one stock batch"""
+            try:
+                logger.debug(f'批量查询股票: 第 {n + 1} 批，共 {len(batch)} 只股票')
+                query_start = time.time()
+
+                # ✅ Date filtering happens in SQL (fast)
+                # 根据 adjust_type 选择查询前复权还是后复权表
+                if self.adjust_type == 'qfq':
+                    df_all = self.db.batch_get_stock_history_qfq(batch, start_date_fmt, end_date_fmt, columns=columns)
+                else:
+                    df_all = self.db.batch_get_stock_history(batch, start_date_fmt, end_date_fmt, columns=columns)
+
+                query_elapsed = time.time() - query_start
+                logger.debug(f'  查询耗时: {query_elapsed:.2f}秒, 返回 {len(df_all)} 行')
+
+                if not df_all.empty:
+                    return split_by_symbol(df_all)
+                logger.warning(f'批量查询股票（第 {n + 1} 批）未返回数据')
+                return {}
+
+            except Exception as e:
+                logger.error(f'批量查询股票失败（第 {n + 1} 批）: {e}，回退到单个查询')
+                # Fallback to individual queries
+                return read_each(batch)
+
         def load_etf_batch():
             """Load all ETF batches"""
-            results = {}
             if not etf_symbols:
-                return results
+                return {}
 
             batch_start = time.time()
-            for i in range(0, len(etf_symbols), ETF_BATCH_SIZE):
-                batch = etf_symbols[i:i+ETF_BATCH_SIZE]
-                try:
-                    logger.debug(f'批量查询ETF: 第 {i//ETF_BATCH_SIZE + 1} 批，共 {len(batch)} 只ETF')
-                    query_start = time.time()
-
-                    # ✅ Date filtering happens in SQL (fast)
-                    # 根据 adjust_type 选择查询前复权还是后复权表
-                    if self.adjust_type == 'qfq':
-                        df_all = self.db.batch_get_etf_history_qfq(batch, start_date_fmt, end_date_fmt)
-                    else:
-                        df_all = self.db.batch_get_etf_history(batch, start_date_fmt, end_date_fmt)
-
-                    query_elapsed = time.time() - query_start
-                    logger.debug(f'  查询耗时: {query_elapsed:.2f}秒, 返回 {len(df_all)} 行')
-
-                    if not df_all.empty:
-                        # ✅ OPTIMIZATION 3: Use groupby instead of loop for symbol filtering
-                        for symbol, group in df_all.groupby('symbol'):
-                            group = group.copy()
-                            group['date'] = pd.to_datetime(group['date']).dt.strftime('%Y%m%d')
-                            group.dropna(inplace=True)
-                            results[symbol] = group
-                    else:
-                        logger.warning(f'批量查询ETF（第 {i//ETF_BATCH_SIZE + 1} 批）未返回数据')
-
-                except Exception as e:
-                    logger.error(f'批量查询ETF失败（第 {i//ETF_BATCH_SIZE + 1} 批）: {e}，回退到单个查询')
-                    # Fallback to individual queries
-                    for s in batch:
-                        df = self._read_postgres(s, start_date, end_date)
-                        if df is not None:
-                            results[s] = df
+            results = run_batches(load_one_etf_batch, etf_symbols, ETF_BATCH_SIZE)
 
             batch_elapsed = time.time() - batch_start
             logger.info(f'✓ ETF数据加载完成: {len(results)} 个标的, 耗时 {batch_elapsed:.2f}秒')
@@ -268,51 +341,19 @@ class DbDataLoader:
 
         def load_stock_batch():
             """Load all stock batches"""
-            results = {}
             if not stock_symbols:
-                return results
+                return {}
 
             batch_start = time.time()
-            for i in range(0, len(stock_symbols), STOCK_BATCH_SIZE):
-                batch = stock_symbols[i:i+STOCK_BATCH_SIZE]
-                try:
-                    logger.debug(f'批量查询股票: 第 {i//STOCK_BATCH_SIZE + 1} 批，共 {len(batch)} 只股票')
-                    query_start = time.time()
-
-                    # ✅ Date filtering happens in SQL (fast)
-                    # 根据 adjust_type 选择查询前复权还是后复权表
-                    if self.adjust_type == 'qfq':
-                        df_all = self.db.batch_get_stock_history_qfq(batch, start_date_fmt, end_date_fmt)
-                    else:
-                        df_all = self.db.batch_get_stock_history(batch, start_date_fmt, end_date_fmt)
-
-                    query_elapsed = time.time() - query_start
-                    logger.debug(f'  查询耗时: {query_elapsed:.2f}秒, 返回 {len(df_all)} 行')
-
-                    if not df_all.empty:
-                        # ✅ OPTIMIZATION 3: Use groupby instead of loop for symbol filtering
-                        for symbol, group in df_all.groupby('symbol'):
-                            group = group.copy()
-                            group['date'] = pd.to_datetime(group['date']).dt.strftime('%Y%m%d')
-                            group.dropna(inplace=True)
-                            results[symbol] = group
-                    else:
-                        logger.warning(f'批量查询股票（第 {i//STOCK_BATCH_SIZE + 1} 批）未返回数据')
-
-                except Exception as e:
-                    logger.error(f'批量查询股票失败（第 {i//STOCK_BATCH_SIZE + 1} 批）: {e}，回退到单个查询')
-                    # Fallback to individual queries
-                    for s in batch:
-                        df = self._read_postgres(s, start_date, end_date)
-                        if df is not None:
-                            results[s] = df
+            results = run_batches(load_one_stock_batch, stock_symbols, STOCK_BATCH_SIZE)
 
             batch_elapsed = time.time() - batch_start
             logger.info(f'✓ 股票数据加载完成: {len(results)} 个标的, 耗时 {batch_elapsed:.2f}秒')
             return results
 
         # ⭐ OPTIMIZATION 4: Parallel processing of ETFs and stocks
-        with ThreadPoolExecutor(max_workers=2) as executor:
+        with ThreadPoolExecutor(max_workers=2) as executor, \
+                ThreadPoolExecutor(max_workers=BATCH_WORKERS) as fallback_executor:
             future_etf = executor.submit(load_etf_batch)
             future_stock = executor.submit(load_stock_batch)
 
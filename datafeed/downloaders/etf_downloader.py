@@ -311,6 +311,10 @@ class EtfDownloader:
 
         logger.info(f'ETF 更新完成: 成功 {stats["success"]}, 失败 {stats["failed"]}')
 
+        # etf_history已更新, 清空本进程内的ETF池缓存
+        from core.etf_universe import EtfUniverse
+        EtfUniverse.invalidate_cache()
+
         return stats
 
 
@@ -240,6 +240,10 @@ class StockDownloader:
 
         logger.info(f'股票更新完成: 成功 {stats["success"]}, 失败 {stats["failed"]}')
 
+        # stock_history已更新, 清空本进程内的股票池缓存
+        from core.stock_universe import StockUniverse
+        StockUniverse.invalidate_cache()
+
         return stats
 
     def fetch_stock_list(self) -> Optional[pd.DataFrame]:
@@ -1,4 +1,6 @@
 
+import functools
+
 from datafeed import mytt
 from datafeed import factor_extends
 from datafeed import factor_qlib
@@ -7,50 +9,78 @@ from datafeed import factor_fundamental
 import numpy as np
 import pandas as pd
 
-class FactorExpr:
-    def __init__(self):
+def _build_base_context():
+    context = {}
+    for method_name in dir(factor_extends):
+        if not method_name.startswith('_'):
+            method = getattr(factor_extends, method_name)
+            context[method_name] = method
+            context[method_name.upper()] = method
+
+    for method_name in dir(mytt):
+        if not method_name.startswith('_'):
+            method = getattr(mytt, method_name)
+            context[method_name] = method
+            context[method_name.upper()] = method
+
+    for method_name in dir(factor_qlib):
+        if not method_name.startswith('_'):
+            method = getattr(factor_qlib, method_name)
+            context[method_name] = method
+            context[method_name.upper()] = method
+
+    # Register fundamental factors
+    for method_name in dir(factor_fundamental):
+        if not method_name.startswith('_'):
+            method = getattr(factor_fundamental, method_name)
+            context[method_name] = method
+            context[method_name.upper()] = method
+
+    # Add math functions to context
+    math_funcs = {
+        'LOG': np.log, 'EXP': np.exp, 'SQRT': np.sqrt, 'ABS': np.abs,
+        'SIN': np.sin, 'COS': np.cos, 'TAN': np.tan, 'POWER': np.power,
+        'SIGN': np.sign, 'MAX': np.maximum, 'MIN': np.minimum,
+        'MEAN': np.mean, 'STD': np.std
+    }
+    context.update(math_funcs)
+
+    # Add numpy and pandas to context
+    context['np'] = np
+    context['pd'] = pd
+    return context
+
+
+@functools.lru_cache(maxsize=1)
+def _base_context():
+    # 函数上下文只依赖模块内容, 进程内只构建一次
+    return _build_base_context()
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_formula(expr: str):
+    """表达式预处理并编译, 按表达式字符串缓存, 多次回测间复用"""
+    # Convert expression to uppercase and handle logical operators
+    expr_upper = expr.upper()
+
+    # For expressions with AND/OR, we need to wrap comparisons in parentheses
+    # This is a simple heuristic that works for common cases like "A > 0 AND B < 10"
+    if ' AND ' in expr_upper or ' OR ' in expr_upper:
+        # Split by AND/OR and wrap each comparison
+        # This is a simplified approach - for production, use a proper parser
+        # For now, just replace the operators
+        expr_upper = expr_upper.replace(' AND ', ') & (')
+        expr_upper = expr_upper.replace(' OR ', ') | (')
+        # Add opening parenthesis at start and closing at end
+        expr_upper = '(' + expr_upper + ')'
+
+    return compile(expr_upper, '<formula>', 'eval')
 
 
-        context = {}
-        for method_name in dir(factor_extends):
-            if not method_name.startswith('_'):
-                method = getattr(factor_extends, method_name)
-                context[method_name] = method
-                context[method_name.upper()] = method
-
-        for method_name in dir(mytt):
-            if not method_name.startswith('_'):
-                method = getattr(mytt, method_name)
-                context[method_name] = method
-                context[method_name.upper()] = method
-
-        for method_name in dir(factor_qlib):
-            if not method_name.startswith('_'):
-                method = getattr(factor_qlib, method_name)
-                context[method_name] = method
-                context[method_name.upper()] = method
-
-        # Register fundamental factors
-        for method_name in dir(factor_fundamental):
-            if not method_name.startswith('_'):
-                method = getattr(factor_fundamental, method_name)
-                context[method_name] = method
-                context[method_name.upper()] = method
-
-        # Add math functions to context
-        math_funcs = {
-            'LOG': np.log, 'EXP': np.exp, 'SQRT': np.sqrt, 'ABS': np.abs,
-            'SIN': np.sin, 'COS': np.cos, 'TAN': np.tan, 'POWER': np.power,
-            'SIGN': np.sign, 'MAX': np.maximum, 'MIN': np.minimum,
-            'MEAN': np.mean, 'STD': np.std
-        }
-        context.update(math_funcs)
-
-        # Add numpy and pandas to context
-        context['np'] = np
-        context['pd'] = pd
-
-        self.context = context
+class FactorExpr:
+    def __init__(self):
+        # 每个实例持有上下文副本: update_base_factors会写入行情列, 多线程回测时不能共享
+        self.context = dict(_base_context())
         #self.update_base_factors()
 
     def update_base_factors(self, df: pd.DataFrame):
@@ -67,25 +97,7 @@ class FactorExpr:
             context = self.context
             self.update_base_factors(df)
 
-            # Convert expression to uppercase and handle logical operators
-            expr_upper = expr.upper()
-
-            # For expressions with AND/OR, we need to wrap comparisons in parentheses
-            # This is a simple heuristic that works for common cases like "A > 0 AND B < 10"
-            import re
-
-            # Replace ' AND ' with ') & (' and add opening/closing parentheses
-            # First, wrap the whole expression in parentheses
-            if ' AND ' in expr_upper or ' OR ' in expr_upper:
-                # Split by AND/OR and wrap each comparison
-                # This is a simplified approach - for production, use a proper parser
-                # For now, just replace the operators
-                expr_upper = expr_upper.replace(' AND ', ') & (')
-                expr_upper = expr_upper.replace(' OR ', ') | (')
-                # Add opening parenthesis at start and closing at end
-                expr_upper = '(' + expr_upper + ')'
-
-            result = eval(expr_upper, context)
+            result = eval(_compile_formula(expr), context)
 
 
             if isinstance(result, tuple):
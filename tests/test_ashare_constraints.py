@@ -115,6 +115,15 @@ def test_price_limit_checker():
     assert abs(limit_price - limit_up) < 0.01, "涨停价计算错误"
     print(f"✓ 涨停价计算: {limit_price:.2f}")
 
+    # 批量检查与逐个检查结果一致
+    symbols = ['000001.SZ', '000001.SZ', '000001.SZ', star_symbol, '000002.SZ']
+    prices = np.array([limit_up, limit_down, normal_price, limit_up_20, 10.0])
+    prev_closes = np.array([prev_close] * 4 + [0.0])
+    batch_hit = checker.is_limit_hit_batch(symbols, prices, prev_closes)
+    expected_hit = [checker.is_limit_hit(s, p, pc)[0] for s, p, pc in zip(symbols, prices, prev_closes)]
+    assert batch_hit.tolist() == expected_hit, f"批量涨跌停检查失败: {batch_hit}"
+    print(f"✓ 批量检测: {batch_hit.tolist()} (符合预期)")
+
     print("\n✅ 涨跌停检查器测试通过!")
 
 
@@ -141,6 +150,13 @@ def test_lot_size_rounder():
         assert rounded == expected, f"手数调整失败: {raw_size} -> {rounded}, 预期 {expected}"
         print(f"✓ 调整: {raw_size}股 -> {rounded}股 (符合预期)")
 
+    # 测试批量整手调整
+    raw_sizes = np.array([raw for raw, _ in test_cases], dtype=float)
+    expected_sizes = np.array([expected for _, expected in test_cases])
+    rounded_sizes = rounder.round_to_lot_array(raw_sizes)
+    assert np.array_equal(rounded_sizes, expected_sizes), f"批量手数调整失败: {rounded_sizes}"
+    print(f"✓ 批量调整: {raw_sizes.tolist()} -> {rounded_sizes.tolist()} (符合预期)")
+
     # 测试按金额调整
     target_value = 10000
     price = 15.5
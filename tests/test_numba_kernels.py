@@ -0,0 +1,188 @@
+"""
+Numba加速内核测试脚本
+
+测试以下功能:
+1. 买卖信号合成 + 前向填充与原pandas实现一致
+2. ATR序列与逐日截取K线的pandas实现一致
+3. 收益率统计量与NumPy实现一致
+4. 超额收益统计量与NumPy实现一致
+5. 分段尾部窗口均值与pandas分组实现一致
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import numpy as np
+
+from core.numba_kernels import (
+    build_hold_signal, _build_hold_signal_numpy, rolling_atr, _rolling_atr_numpy, return_stats,
+    excess_return_stats, tail_means, _tail_means_numpy,
+)
+
+
+def _reference_hold_signal(buy, sell, shape):
+    """原pandas实现: where -> where -> ffill -> fillna(0)"""
+    if buy is None:
+        signal = np.ones(shape)
+    else:
+        signal = np.where(buy, 1, np.nan)
+    if sell is not None:
+        signal = np.where(sell, 0, signal)
+    return pd.DataFrame(signal).ffill().fillna(0).to_numpy()
+
+
+def test_build_hold_signal():
+    """测试持仓信号合成"""
+    print("\n" + "="*50)
+    print("测试持仓信号合成")
+    print("="*50)
+
+    rng = np.random.default_rng(42)
+    shape = (250, 6)
+    buy = rng.random(shape) < 0.1
+    sell = rng.random(shape) < 0.1
+
+    for b, s, desc in [(buy, sell, '买入+卖出'), (None, sell, '仅卖出'), (buy, None, '仅买入')]:
+        expected = _reference_hold_signal(b, s, shape)
+        result = build_hold_signal(b, s, shape)
+        assert result.dtype == np.bool_, f"{desc}: 信号矩阵应为bool类型"
+        assert np.array_equal(result, expected), f"{desc}: 信号合成结果与pandas实现不一致"
+
+        fallback = _build_hold_signal_numpy(
+            np.ones(shape, dtype=bool) if b is None else b,
+            np.zeros(shape, dtype=bool) if s is None else s,
+            np.empty(shape, dtype=bool),
+        )
+        assert np.array_equal(fallback, expected), f"{desc}: NumPy实现与pandas实现不一致"
+        print(f"✓ {desc}: 结果一致")
+
+    # 同日买卖信号同时满足时卖出优先
+    both = np.ones((3, 1), dtype=bool)
+    result = build_hold_signal(both, both, (3, 1))
+    assert not result.any(), "卖出信号应优先于买入信号"
+    print("✓ 卖出优先")
+
+    # 信号形状与目标形状不一致时报错(内核不做越界检查)
+    for b, s, target in [(buy, sell, (249, 6)), (buy, sell, (251, 6)), (None, sell, (250, 5)), (buy, None, (251, 6))]:
+        try:
+            build_hold_signal(b, s, target)
+        except ValueError:
+            continue
+        raise AssertionError(f"形状{target}与信号形状{shape}不一致时应抛出ValueError")
+    print("✓ 形状不一致时报错")
+
+    print("\n✅ 持仓信号合成测试通过!")
+
+
+def _reference_atr(df, period):
+    """原pandas实现: 截取最近period+1根K线计算TR后取滚动均值"""
+    result = []
+    for pos in range(len(df)):
+        hist = df.iloc[:pos + 1].tail(period + 1)
+        if len(hist) < period + 1:
+            result.append(np.nan)
+            continue
+        tr = pd.concat([
+            hist['high'] - hist['low'],
+            (hist['high'] - hist['close'].shift(1)).abs(),
+            (hist['low'] - hist['close'].shift(1)).abs()
+        ], axis=1).max(axis=1)
+        result.append(tr.rolling(period).mean().iloc[-1])
+    return np.array(result)
+
+
+def test_rolling_atr():
+    """测试ATR序列计算"""
+    print("\n" + "="*50)
+    print("测试ATR序列计算")
+    print("="*50)
+
+    rng = np.random.default_rng(7)
+    n, period = 120, 14
+    close = 10 + rng.standard_normal(n).cumsum() * 0.1
+    high = close + rng.random(n)
+    low = close - rng.random(n)
+    high[30] = np.nan
+    close[60] = np.nan
+    df = pd.DataFrame({'high': high, 'low': low, 'close': close})
+
+    expected = _reference_atr(df, period)
+    for result, desc in [
+        (rolling_atr(high, low, close, period), '内核实现'),
+        (_rolling_atr_numpy(high, low, close, period, np.empty(n)), 'NumPy实现'),
+    ]:
+        assert np.allclose(result, expected, rtol=0, atol=1e-12, equal_nan=True), f"{desc}: ATR与pandas实现不一致"
+        print(f"✓ {desc}: 结果一致")
+
+    print("\n✅ ATR序列计算测试通过!")
+
+
+def test_return_stats():
+    """测试收益率统计量"""
+    print("\n" + "="*50)
+    print("测试收益率统计量")
+    print("="*50)
+
+    rng = np.random.default_rng(11)
+    returns = rng.normal(0.0005, 0.012, 1000)
+    downside = returns[returns < 0]
+
+    mean, std, downside_std, n_down = return_stats(returns)
+    assert np.isclose(mean, returns.mean(), rtol=1e-12, atol=0), "均值不一致"
+    assert np.isclose(std, returns.std(), rtol=1e-12, atol=0), "标准差不一致"
+    assert np.isclose(downside_std, downside.std(), rtol=1e-12, atol=0), "下行标准差不一致"
+    assert n_down == len(downside), "负收益天数不一致"
+    print("✓ 统计量一致")
+
+    # 无负收益时下行标准差为0
+    assert return_stats(np.abs(returns))[2:] == (0.0, 0)
+    print("✓ 无负收益")
+
+    # 超额收益统计量
+    benchmark = rng.normal(0.0003, 0.01, 1000)
+    excess = returns - benchmark
+    excess_mean, excess_std = excess_return_stats(returns, benchmark)
+    assert np.isclose(excess_mean, excess.mean(), rtol=1e-12, atol=0), "超额收益均值不一致"
+    assert np.isclose(excess_std, excess.std(), rtol=1e-12, atol=0), "超额收益标准差不一致"
+    print("✓ 超额收益统计量一致")
+
+    print("\n✅ 收益率统计量测试通过!")
+
+
+def test_tail_means():
+    """测试分段尾部窗口均值"""
+    print("\n" + "="*50)
+    print("测试分段尾部窗口均值")
+    print("="*50)
+
+    rng = np.random.default_rng(5)
+    lengths = [0, 3, 25, 1, 0, 40, 20]
+    values = rng.random((sum(lengths), 2))
+    values[rng.random(values.shape) < 0.2] = np.nan
+    values[3:6, 0] = np.nan  # 第3段第一列全为NaN
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+    frame = pd.DataFrame(values)
+    keys = np.repeat(np.arange(len(lengths)), lengths)
+    for window in (1, 5, 20):
+        # 原pandas实现: 按段取tail(window)后求均值, 空段为NaN
+        recent = frame.groupby(keys).tail(window)
+        expected = recent.groupby(keys[recent.index]).mean().reindex(range(len(lengths))).to_numpy()
+        for result, desc in [
+            (tail_means(values, offsets, window), '内核实现'),
+            (_tail_means_numpy(values, offsets, window, np.empty((len(lengths), 2))), 'NumPy实现'),
+        ]:
+            assert np.allclose(result, expected, rtol=1e-12, atol=0, equal_nan=True), \
+                f"{desc}(window={window}): 尾部均值与pandas实现不一致"
+        print(f"✓ window={window}: 结果一致")
+
+    print("\n✅ 分段尾部窗口均值测试通过!")
+
+
+if __name__ == '__main__':
+    test_build_hold_signal()
+    test_rolling_atr()
+    test_return_stats()
+    test_tail_means()
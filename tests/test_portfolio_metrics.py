@@ -0,0 +1,154 @@
+"""
+组合绩效指标测试脚本
+
+测试以下功能:
+1. 批量计算batch_calculate与单实例calculate_all_metrics结果一致
+2. 偏度/峰度与scipy.stats.skew/kurtosis(bias=True)一致
+3. 月度收益按原始日收益连乘, 缺失收益使当月为NaN
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import numpy as np
+import pytest
+
+from core.portfolio_metrics import PortfolioMetrics
+
+
+BATCH_COLUMNS = ['annual_return', 'volatility', 'sharpe_ratio', 'sortino_ratio',
+                 'calmar_ratio', 'max_drawdown', 'var_95', 'cvar_95']
+
+
+def _daily_states(returns, initial=1_000_000.0):
+    """由日收益率构造逐日净值(首日收益为0, 与PortfolioMetrics由净值推导收益的口径一致)"""
+    dates = pd.bdate_range('2022-01-03', periods=len(returns))
+    equity = initial * np.cumprod(1 + returns)
+    return [{'date': d, 'equity': v} for d, v in zip(dates, equity)]
+
+
+def test_batch_calculate():
+    """测试批量指标计算与单实例一致"""
+    print("\n" + "="*50)
+    print("测试批量指标计算")
+    print("="*50)
+
+    rng = np.random.default_rng(11)
+    returns_list = []
+    for n in (300, 120, 45):
+        returns = rng.normal(0.0004, 0.012, n)
+        returns[0] = 0.0  # batch_calculate要求首日收益为0才与单实例口径一致
+        returns_list.append(returns)
+    returns_list.insert(2, np.array([]))  # 空序列
+    names = ['a', 'b', 'empty', 'c']
+
+    result = PortfolioMetrics.batch_calculate(returns_list, risk_free_rate=0.03, names=names)
+    assert list(result.columns) == BATCH_COLUMNS, "结果列与约定不一致"
+    assert list(result.index) == names, "结果索引应为names"
+
+    for name, returns in zip(names, returns_list):
+        if len(returns) == 0:
+            assert (result.loc[name] == 0).all(), "空序列的各项指标应为0"
+            print(f"✓ {name}: 空序列指标为0")
+            continue
+
+        expected = PortfolioMetrics(_daily_states(returns), risk_free_rate=0.03).calculate_all_metrics()
+        for col in BATCH_COLUMNS:
+            assert np.isclose(result.loc[name, col], expected[col], rtol=1e-9, atol=1e-12), \
+                f"{name}({len(returns)}天) {col}: 批量 {result.loc[name, col]} != 单实例 {expected[col]}"
+        print(f"✓ {name}({len(returns)}天): 与单实例一致")
+
+    # 长短不一的序列补齐后, 短序列结果不受补齐部分影响
+    alone = PortfolioMetrics.batch_calculate([returns_list[3]])
+    assert np.allclose(alone.iloc[0].to_numpy(), result.loc['c'].to_numpy(), rtol=1e-12, atol=0), \
+        "短序列单独计算与批量计算结果不一致"
+    print("✓ 补齐不影响短序列")
+
+    # 无输入时返回空表
+    empty = PortfolioMetrics.batch_calculate([])
+    assert empty.empty and list(empty.columns) == BATCH_COLUMNS, "无输入时应返回空DataFrame"
+    print("✓ 无输入返回空表")
+
+    print("\n✅ 批量指标计算测试通过!")
+
+
+def _metrics_from_returns(returns):
+    """直接以给定日收益率构造指标计算器(不由净值推导收益)"""
+    dates = pd.bdate_range('2022-01-03', periods=len(returns))
+    df = pd.DataFrame({'date': dates, 'equity': np.cumprod(1 + returns), 'daily_return': returns})
+    return PortfolioMetrics(df)
+
+
+def test_skewness_kurtosis():
+    """测试偏度/峰度与scipy实现一致"""
+    stats = pytest.importorskip('scipy.stats')
+    print("\n" + "="*50)
+    print("测试偏度/峰度")
+    print("="*50)
+
+    rng = np.random.default_rng(3)
+    for desc, returns in [('正态', rng.normal(0.0005, 0.01, 250)),
+                          ('偏态', rng.lognormal(0, 0.8, 400) * 0.01 - 0.012)]:
+        metrics = _metrics_from_returns(returns)
+        assert np.isclose(metrics._calculate_skewness(), stats.skew(returns, bias=True), rtol=1e-10), \
+            f"{desc}: 偏度与scipy不一致"
+        assert np.isclose(metrics._calculate_kurtosis(), stats.kurtosis(returns, bias=True), rtol=1e-10), \
+            f"{desc}: 峰度与scipy不一致"
+        print(f"✓ {desc}: 与scipy一致")
+
+    # 收益率恒定时二阶矩为0, 偏度和峰度无定义
+    metrics = _metrics_from_returns(np.full(30, 0.001))
+    assert np.isnan(metrics._calculate_skewness()) and np.isnan(metrics._calculate_kurtosis()), \
+        "收益率恒定时偏度和峰度应为NaN"
+    distribution = metrics.get_returns_distribution()
+    assert np.isnan(distribution['skewness']) and np.isnan(distribution['kurtosis'])
+    print("✓ 恒定收益: NaN")
+
+    # 样本不足: 偏度至少3个观测, 峰度至少4个观测, 否则为0
+    two = _metrics_from_returns(np.array([0.01, -0.02]))
+    assert two._calculate_skewness() == 0.0 and two._calculate_kurtosis() == 0.0, "少于3个观测时应为0"
+    three_returns = np.array([0.01, -0.02, 0.005])
+    three = _metrics_from_returns(three_returns)
+    assert np.isclose(three._calculate_skewness(), stats.skew(three_returns, bias=True), rtol=1e-10), \
+        "3个观测时偏度应正常计算"
+    assert three._calculate_kurtosis() == 0.0, "少于4个观测时峰度应为0"
+    four_returns = np.array([0.01, -0.02, 0.005, 0.03])
+    four = _metrics_from_returns(four_returns)
+    assert np.isclose(four._calculate_kurtosis(), stats.kurtosis(four_returns, bias=True), rtol=1e-10), \
+        "4个观测时峰度应正常计算"
+    print("✓ 样本不足时返回0")
+
+    print("\n✅ 偏度/峰度测试通过!")
+
+
+def test_monthly_returns():
+    """测试月度收益与月胜率"""
+    print("\n" + "="*50)
+    print("测试月度收益")
+    print("="*50)
+
+    dates = pd.to_datetime(['2024-01-30', '2024-01-31', '2024-02-01', '2024-02-02', '2024-03-01', '2024-03-04'])
+    returns = np.array([0.0, 0.01, -0.02, np.nan, 0.03, -0.01])
+    df = pd.DataFrame({'date': dates, 'equity': np.cumprod(1 + np.nan_to_num(returns)), 'daily_return': returns})
+    metrics = PortfolioMetrics(df)
+
+    monthly = metrics.calculate_monthly_returns()
+    assert list(monthly) == ['2024-01', '2024-02', '2024-03'], "月份键不正确"
+    assert np.isclose(monthly['2024-01'], 0.01)
+    assert np.isnan(monthly['2024-02']), "当月有缺失收益时月度收益应为NaN"
+    assert np.isclose(monthly['2024-03'], 1.03 * 0.99 - 1)
+    print("✓ 缺失收益的月份为NaN")
+
+    # NaN月份不计为盈利月
+    assert np.isclose(metrics.calculate_win_rate()['monthly'], 2 / 3 * 100), "月胜率不正确"
+    print("✓ 月胜率")
+
+    print("\n✅ 月度收益测试通过!")
+
+
+if __name__ == '__main__':
+    test_batch_calculate()
+    test_skewness_kurtosis()
+    test_monthly_returns()